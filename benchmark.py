@@ -0,0 +1,204 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+from datetime import timedelta
+from time import monotonic
+
+import kuma_api
+import mock_kuma
+
+
+# Throughput and memory of the export paths against mock_kuma.py:
+#
+#   python benchmark.py --alerts 200000 --latency 5
+#   python benchmark.py --output before.json
+#   python benchmark.py --baseline before.json
+#
+# The mock runs in its own process and every case in a fresh one, so the
+# peak RSS of a case is its own. With --baseline the run fails when a
+# case got slower or heavier than --tolerance allows.
+
+CASES = ['alerts_list', 'alerts_export', 'alerts_sharded', 'incidents_list', 'incidents_export',
+         'resources_list', 'resources_dump', 'rules_all_correlators', 'backup', 'import_assets']
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_case(case, port, volumes, fmt='csv'):
+
+    # Runs one case in this process and returns its measurements
+    kuma = kuma_api.Kuma(scheme='http', index_refresh=0, cache_ttl=0)
+    result = kuma.connect('127.0.0.1', str(port), 'benchmark')
+    if result['status'] != kuma.OK:
+        raise SystemExit(f"Can't connect to the mock: {result['details']}")
+
+    temp_path = tempfile.NamedTemporaryFile(delete=False).name
+    rss_before = peak_rss_mb()
+    started = monotonic()
+    unit = 'rows'
+    # rows actually written by the export cases
+    written = [0]
+    count = lambda rows: written.__setitem__(0, rows)
+
+    if case == 'alerts_list':
+        result, rows = kuma.get_alerts_list()
+        items = len(rows)
+    elif case == 'alerts_export':
+        result = kuma_api.write_export(temp_path, fmt, kuma_api.ALERTS_HEADER, kuma.iter_alerts(), count)
+        items = written[0]
+    elif case == 'alerts_sharded':
+        start = mock_kuma.BASE_TIME
+        end = start + timedelta(seconds=volumes['alerts'])
+        result = kuma_api.write_export(temp_path, fmt, kuma_api.ALERTS_HEADER, kuma.iter_alerts(None, 'firstSeen', start, end, True), count)
+        items = written[0]
+    elif case == 'incidents_list':
+        result, rows = kuma.get_incidents_list()
+        items = len(rows)
+    elif case == 'incidents_export':
+        result = kuma_api.write_export(temp_path, fmt, kuma_api.INCIDENTS_HEADER, kuma.iter_incidents(), count)
+        items = written[0]
+    elif case == 'resources_list':
+        result, rows = kuma.get_resources_list()
+        items = len(rows)
+    elif case == 'resources_dump':
+        items, failed = kuma_api.dump_resources(kuma, temp_path)
+        result = {"status": kuma.ERROR if failed else kuma.OK, "details": f"{len(failed)} resources failed"}
+        unit = 'resources'
+    elif case == 'rules_all_correlators':
+        result, rows = kuma.get_rules_from_all_correlators()
+        items = len(rows)
+    elif case == 'backup':
+        result = kuma.backup(temp_path)
+        items = os.path.getsize(temp_path) / 2**20
+        unit = 'MiB'
+    elif case == 'import_assets':
+        assets = [{"name": f"host{i}", "fqdn": [f"host{i}.example.com"], "ipAddresses": [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}"],
+                   "macAddresses": [], "os": {"name": "Linux", "version": 5}} for i in range(volumes['assets'])]
+        report = kuma.import_assets_batched(assets, mock_kuma.make_id(1, 0))
+        items = sum(batch['imported'] for batch in report)
+        rejected = sum(len(batch['rejected']) for batch in report)
+        result = {"status": kuma.ERROR if rejected else kuma.OK, "details": f"{rejected} assets rejected" if rejected else ''}
+        unit = 'assets'
+    else:
+        raise SystemExit(f"Unknown case {case}")
+
+    seconds = monotonic() - started
+    os.remove(temp_path)
+    kuma.close()
+
+    counters = kuma_api.metrics.counters
+    return {
+        'case': case,
+        'status': result['status'],
+        'details': result['details'],
+        'items': round(items, 1),
+        'unit': unit,
+        'seconds': round(seconds, 3),
+        'per_second': round(items / seconds, 1) if seconds else None,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'rss_growth_mb': round(peak_rss_mb() - rss_before, 1),
+        'requests': sum(counters.get('kuma_api_requests_total', {}).values()),
+        'retries': sum(counters.get('kuma_api_retries_total', {}).values()),
+        'pages': sum(counters.get('kuma_api_pages_total', {}).values())
+    }
+
+
+def compare(results, baseline, tolerance):
+
+    # Returns the regressions against a previous --output file
+    regressions = []
+    before = {result['case']: result for result in baseline}
+    for result in results:
+        old = before.get(result['case'])
+        if not old or result['status'] != 'OK':
+            continue
+        if old['per_second'] and result['per_second'] < old['per_second'] * (1 - tolerance):
+            regressions.append(f"{result['case']}: {result['per_second']} {result['unit']}/s, was {old['per_second']}")
+        if result['rss_growth_mb'] > max(old['rss_growth_mb'] * (1 + tolerance), old['rss_growth_mb'] + 5):
+            regressions.append(f"{result['case']}: RSS grew by {result['rss_growth_mb']} MiB, was {old['rss_growth_mb']}")
+    return regressions
+
+
+def build_parser():
+
+    parser = mock_kuma.build_parser()
+    parser.description = "Benchmarks the KUMA client against mock_kuma.py"
+    parser.set_defaults(port=0)
+    parser.add_argument('--assets', type=int, default=20000, help="assets to import")
+    parser.add_argument('--cases', nargs='+', choices=CASES, default=CASES)
+    parser.add_argument('--format', choices=kuma_api.EXPORT_FORMATS, default='csv', help="format of the export cases")
+    parser.add_argument('--output', help="write the results as JSON")
+    parser.add_argument('--baseline', help="results JSON of an earlier run to compare with")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed slowdown or RSS growth, 0.2 is 20%%")
+    parser.add_argument('--case', help=argparse.SUPPRESS)
+    return parser
+
+
+def main():
+
+    options = build_parser().parse_args()
+    volumes = {'alerts': options.alerts, 'incidents': options.incidents, 'assets': options.assets}
+
+    if options.case:
+        print(json.dumps(run_case(options.case, options.port, volumes, options.format)))
+        return 0
+
+    mock = subprocess.Popen([sys.executable, mock_kuma.__file__, *mock_arguments(options)], stdout=subprocess.PIPE, text=True)
+    try:
+        # the mock prints its url once it listens
+        port = int(mock.stdout.readline().rsplit(':', 1)[1].split('/')[0])
+        results = []
+        print(f"{'case':<24}{'status':<8}{'items':>12}{'unit':>10}{'seconds':>10}{'per second':>14}"
+              f"{'peak RSS MiB':>14}{'RSS growth':>12}{'requests':>10}{'retries':>9}")
+        for case in options.cases:
+            run = subprocess.run([sys.executable, __file__, '--case', case, '--port', str(port),
+                                  '--alerts', str(options.alerts), '--incidents', str(options.incidents),
+                                  '--assets', str(options.assets), '--format', options.format], capture_output=True, text=True)
+            if run.returncode != 0:
+                print(f"{case} failed:\n{run.stderr}", file=sys.stderr)
+                continue
+            results.append(json.loads(run.stdout.splitlines()[-1]))
+            print_result(results[-1])
+    finally:
+        mock.terminate()
+        mock.wait()
+
+    if options.output:
+        with open(options.output, 'w', encoding='utf8') as f:
+            json.dump(results, f, indent=2)
+
+    if options.baseline:
+        with open(options.baseline, encoding='utf8') as f:
+            regressions = compare(results, json.load(f), options.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+
+    return 0
+
+
+def mock_arguments(options):
+    # the mock gets the same volumes, latency and errors, on a free port
+    arguments = ['--port', '0']
+    for name in ('alerts', 'incidents', 'tenants', 'resources', 'correlators', 'rules', 'resource_kb', 'backup_mb',
+                 'latency', 'jitter', 'error_rate', 'error_code'):
+        arguments += ['--' + name.replace('_', '-'), str(getattr(options, name))]
+    return arguments
+
+
+def print_result(result):
+    print(f"{result['case']:<24}{result['status']:<8}{result['items']:>12}{result['unit']:>10}{result['seconds']:>10}"
+          f"{result['per_second']:>14}{result['peak_rss_mb']:>14}{result['rss_growth_mb']:>12}{result['requests']:>10}"
+          f"{result['retries']:>9}", flush=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
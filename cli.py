@@ -0,0 +1,257 @@
+import argparse
+import csv
+import json
+import os
+import shutil
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from kuma_api import (Kuma, KumaFleet, JobManager, POOL_SIZE, WORKERS, CACHE_TTL, EXPORT_FORMATS, ALERTS_COLUMNS, INCIDENTS_COLUMNS,
+                      snapshot_store, available_formats, parse_columns,
+                      load_cores, run_export, run_fleet_export, run_rules_export, run_fleet_rules_export, run_backup, run_restore, run_resources_dump, run_snapshot,
+                      run_assets_import, read_assets_csv, validate_assets_csv, write_snapshots_diff)
+
+
+# Headless entry point for scripts and cron: python main.py <command> ...
+# Gradio is never imported here. Exit codes: 0 - done, 1 - failed or
+# cancelled, 2 - done with warnings (rejected assets, resources that
+# could not be fetched).
+
+
+def build_parser():
+
+    parser = argparse.ArgumentParser(prog='main.py', description="KUMA's User Assistant, headless mode. "
+                                     "Without a command the web interface is started.")
+    parser.add_argument('--address', default=os.environ.get('KUMA_POMOGATOR_ADDRESS'),
+                        help="KUMA Core address, env KUMA_POMOGATOR_ADDRESS")
+    parser.add_argument('--port', default=os.environ.get('KUMA_POMOGATOR_PORT', '7223'),
+                        help="KUMA API port, env KUMA_POMOGATOR_PORT, default 7223")
+    parser.add_argument('--token', default=os.environ.get('KUMA_POMOGATOR_TOKEN'),
+                        help="KUMA API token, env KUMA_POMOGATOR_TOKEN (preferred, keeps it out of the process list)")
+    parser.add_argument('--cores', help="JSON file with several cores to export alerts, incidents and rules (--all) "
+                                        "from all of them at once instead of --address/--token")
+    parser.add_argument('-q', '--quiet', action='store_true', help="do not show progress")
+    parser.add_argument('--timing', action='store_true', help="print the job's timing summary as JSON to stderr")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    for kind, statuses, time_fields in (('alerts', ["new", "assigned", "closed", "escalated"], ["firstSeen", "lastSeen"]),
+                                        ('incidents', ["open", "assigned", "closed"], ["createdAt", "updatedAt"])):
+        export = commands.add_parser(kind, help=f"export {kind} to CSV, NDJSON or Parquet")
+        export.add_argument('-o', '--output', required=True, help="file to write")
+        export.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+        export.add_argument('--columns', help="comma separated columns: default ones, API fields like "
+                                              "'sourceAddress' or 'column=field.path'")
+        export.add_argument('--status', nargs='+', choices=statuses, default=statuses)
+        export.add_argument('--time-field', choices=time_fields)
+        export.add_argument('--from', dest='start', type=datetime.fromisoformat, help="ISO timestamp, needs --time-field")
+        export.add_argument('--to', dest='end', type=datetime.fromisoformat, help="ISO timestamp, needs --time-field")
+        export.add_argument('--sharded', action='store_true', help="split the period into time windows")
+        export.add_argument('--incremental', action='store_true', help="only records changed since the previous incremental export")
+
+    rules = commands.add_parser('rules', help="export correlation rules to CSV, NDJSON or Parquet")
+    rules.add_argument('-o', '--output', required=True, help="file to write")
+    rules.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+    source = rules.add_mutually_exclusive_group(required=True)
+    source.add_argument('--correlator', help="correlator id")
+    source.add_argument('--tenant', help="tenant id")
+    source.add_argument('--all', action='store_true', help="all correlators of the core")
+
+    backup = commands.add_parser('backup', help="download the core backup")
+    backup.add_argument('-o', '--output', required=True, help="tar.gz file to write")
+
+    restore = commands.add_parser('restore', help="upload a backup and schedule restore")
+    restore.add_argument('file', help="backup tar.gz")
+
+    assets = commands.add_parser('import-assets', help="validate and import assets from CSV")
+    assets.add_argument('file', help="CSV with columns name,fqdn,ipAddresses,macAddresses,osName,osVersion")
+    assets.add_argument('--tenant', required=True, help="tenant id")
+    assets.add_argument('--batch-size', type=int, default=1000)
+    assets.add_argument('--rejected', help="CSV file for rejected assets, if any")
+
+    dump = commands.add_parser('dump', help="dump the full JSON of every resource")
+    dump.add_argument('-o', '--output', required=True, help="archive to write")
+    dump.add_argument('--format', choices=['ndjson', 'tar'], default='ndjson', help="gzip NDJSON or tar.gz")
+
+    commands.add_parser('snapshot', help="take a configuration snapshot of all resources")
+
+    diff = commands.add_parser('diff', help="compare two snapshots, of one core or of two cores; no connection needed")
+    diff.add_argument('snapshot_a', help="snapshot as printed by the snapshot command (<core>/<time>) or its directory")
+    diff.add_argument('snapshot_b', help="the same for the second snapshot")
+    diff.add_argument('--by', choices=['id', 'name'], default='id',
+                      help="match resources by id or by kind, tenant and name (recreated resources, two cores)")
+    diff.add_argument('-o', '--output', required=True, help="CSV file to write")
+
+    return parser
+
+
+def run_job(name, fn, args, quiet):
+
+    # Runs one job the way the UI does and shows its progress on stderr,
+    # Ctrl+C cancels it
+    job = JobManager(workers=1).submit(name, fn, *args)
+    show = not quiet and sys.stderr.isatty()
+
+    try:
+        while not job.done_event.wait(0.5):
+            if show and job.progress:
+                print(f"\r{job.describe_progress()}\033[K", end='', file=sys.stderr, flush=True)
+    except KeyboardInterrupt:
+        job.cancel()
+        job.done_event.wait()
+
+    if show:
+        print(file=sys.stderr)
+    if job.status == 'done' and job.details:
+        print(job.details, file=sys.stderr)
+
+    return job
+
+
+def main(argv=None):
+
+    options = build_parser().parse_args(argv)
+    if options.command in ('alerts', 'incidents', 'rules') and options.format not in available_formats():
+        print(f"--format {options.format} needs an optional package, see README", file=sys.stderr)
+        return 1
+    if options.command in ('alerts', 'incidents'):
+        try:
+            options.columns = parse_columns(options.columns, ALERTS_COLUMNS if options.command == 'alerts' else INCIDENTS_COLUMNS)
+        except ValueError as e:
+            print(f"--columns: {e}", file=sys.stderr)
+            return 1
+    if options.command == 'diff':
+        return diff_main(options)
+    if options.cores:
+        return fleet_main(options)
+    if not options.address or not options.token:
+        print("--address and --token (or KUMA_POMOGATOR_ADDRESS and KUMA_POMOGATOR_TOKEN) are required", file=sys.stderr)
+        return 1
+
+    command = options.command
+    if command == 'import-assets':
+        # nothing is sent to the core if the CSV has problems
+        try:
+            errors = validate_assets_csv(options.file)
+            assets, lines = read_assets_csv(options.file) if not errors else ([], [])
+        except (OSError, csv.Error, UnicodeDecodeError) as e:
+            print(f"Can't read {options.file}: {e}", file=sys.stderr)
+            return 1
+        for line, field, value, reason in errors:
+            print(f"line {line}: {field} {value!r}: {reason}", file=sys.stderr)
+        if errors:
+            print(f"Nothing was imported: {len(errors)} problems found in CSV", file=sys.stderr)
+            return 1
+
+    # no background index, a command lives for one operation only
+    kuma = Kuma(pool_size=POOL_SIZE, workers=WORKERS, cache_ttl=CACHE_TTL, index_refresh=0)
+    try:
+        result = kuma.connect(options.address, options.port, options.token)
+        if result['status'] != kuma.OK:
+            print(f"Connection failed: {result['details']}", file=sys.stderr)
+            return 1
+
+        if command in ('alerts', 'incidents'):
+            job = run_job(f"{command.capitalize()} export", run_export,
+                          (kuma, command, options.status, options.time_field, options.start, options.end,
+                           options.sharded, options.incremental, options.format, options.columns), options.quiet)
+        elif command == 'rules':
+            choice = 'By tenant' if options.tenant else 'All correlators' if options.all else 'By correlator'
+            job = run_job("Rules export", run_rules_export,
+                          (kuma, choice, options.correlator, options.tenant, options.format), options.quiet)
+        elif command == 'backup':
+            job = run_job("Backup", run_backup, (kuma,), options.quiet)
+        elif command == 'restore':
+            job = run_job("Restore", run_restore, (kuma, options.file), options.quiet)
+        elif command == 'import-assets':
+            job = run_job("Assets import", run_assets_import,
+                          (kuma, assets, lines, options.tenant, options.batch_size), options.quiet)
+            if job.output:
+                print(job.output, file=sys.stderr)
+            options.output = options.rejected
+        elif command == 'dump':
+            job = run_job("Resources dump", run_resources_dump, (kuma, options.format), options.quiet)
+        else:
+            job = run_job("Snapshot", run_snapshot, (kuma, snapshot_store), options.quiet)
+    finally:
+        kuma.close()
+
+    return finish(job, options)
+
+
+def finish(job, options):
+
+    if options.timing:
+        print(json.dumps(job.summary()), file=sys.stderr)
+
+    if job.status != 'done':
+        print(f"{job.name} {job.status}: {job.details}", file=sys.stderr)
+        return 1
+
+    if job.path:
+        if getattr(options, 'output', None):
+            shutil.move(job.path, options.output)
+        else:
+            print(f"Saved to {job.path}", file=sys.stderr)
+
+    return 2 if job.warning else 0
+
+
+def fleet_main(options):
+
+    # The same exports for every core of the --cores file, merged into one
+    # file with the core name in the first column
+    command = options.command
+    if command not in ('alerts', 'incidents', 'rules') or (command == 'rules' and not options.all):
+        print("With --cores only alerts, incidents and rules --all are supported", file=sys.stderr)
+        return 1
+    if getattr(options, 'incremental', False):
+        print("Incremental export is not supported with --cores", file=sys.stderr)
+        return 1
+
+    try:
+        cores = load_cores(options.cores)
+    except (OSError, ValueError) as e:
+        print(f"Can't load {options.cores}: {e}", file=sys.stderr)
+        return 1
+
+    fleet = KumaFleet(cores, pool_size=POOL_SIZE, workers=WORKERS, cache_ttl=CACHE_TTL, index_refresh=0)
+    try:
+        failed = {name: result['details'] for name, result in fleet.connect().items() if result['status'] != fleet.OK}
+        for name, details in failed.items():
+            print(f"Connection to {name} failed: {details}", file=sys.stderr)
+        if not fleet.clients:
+            return 1
+
+        if command == 'rules':
+            job = run_job("Rules export", run_fleet_rules_export, (fleet, options.format), options.quiet)
+        else:
+            job = run_job(f"{command.capitalize()} export", run_fleet_export,
+                          (fleet, command, options.status, options.time_field, options.start, options.end,
+                           options.sharded, options.format, options.columns), options.quiet)
+    finally:
+        fleet.close()
+
+    code = finish(job, options)
+    return 2 if code == 0 and failed else code
+
+
+def diff_main(options):
+
+    # Snapshots are local, the core is not asked
+    snapshots = []
+    for name in (options.snapshot_a, options.snapshot_b):
+        path = Path(name) if Path(name, 'manifest.json').is_file() else snapshot_store.root / name
+        if not (path / 'manifest.json').is_file():
+            print(f"No snapshot {name} in {snapshot_store.root}", file=sys.stderr)
+            return 1
+        snapshots.append(path)
+
+    try:
+        counts = write_snapshots_diff(options.output, *snapshots, options.by)
+    except OSError as e:
+        print(f"Diff failed: {e}", file=sys.stderr)
+        return 1
+
+    print(f"Added: {counts['added']}, removed: {counts['removed']}, changed: {counts['changed']}", file=sys.stderr)
+    return 0
@@ -0,0 +1,2788 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.exceptions import NewConnectionError
+import csv
+import gzip
+import io
+import shutil
+import tarfile
+import tempfile
+from time import strftime, monotonic, time, localtime, sleep
+from pathlib import Path
+from collections import deque, OrderedDict
+from itertools import islice
+from uuid import uuid4
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta, timezone
+import hashlib
+import json
+import os
+import re
+import ipaddress
+import queue
+import threading
+import contextvars
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from email.utils import parsedate_to_datetime
+
+# Optional speedups, everything works with the standard library alone
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# Optional export formats: csv.zst and Parquet
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+requests.packages.urllib3.disable_warnings(requests.packages.urllib3.exceptions.InsecureRequestWarning)
+
+# Deployment settings, see README
+WORKERS = int(os.environ.get('KUMA_POMOGATOR_WORKERS', 4))
+POOL_SIZE = int(os.environ.get('KUMA_POMOGATOR_POOL_SIZE', 10))
+CACHE_TTL = int(os.environ.get('KUMA_POMOGATOR_CACHE_TTL', 300))
+INDEX_REFRESH = int(os.environ.get('KUMA_POMOGATOR_INDEX_REFRESH', 600))
+JOB_WORKERS = int(os.environ.get('KUMA_POMOGATOR_JOBS', 4))
+MAX_RPS = float(os.environ.get('KUMA_POMOGATOR_MAX_RPS', 0))
+MAX_INFLIGHT = int(os.environ.get('KUMA_POMOGATOR_MAX_INFLIGHT', 16))
+METRICS_PORT = int(os.environ.get('KUMA_POMOGATOR_METRICS_PORT', 0))
+# the same interface as the web interface unless set, 0.0.0.0 for all
+METRICS_HOST = os.environ.get('KUMA_POMOGATOR_METRICS_HOST', os.environ.get('GRADIO_SERVER_NAME', '127.0.0.1'))
+# 'auto' (orjson if installed), 'orjson' or 'stdlib'
+JSON_BACKEND = os.environ.get('KUMA_POMOGATOR_JSON', 'auto')
+DATA_DIR = Path(os.environ.get('KUMA_POMOGATOR_DATA', Path.home() / '.kuma_pomogator'))
+ARTIFACTS_QUOTA = int(os.environ.get('KUMA_POMOGATOR_ARTIFACTS_MB', 10240)) * 2**20
+ARTIFACT_MAX_AGE = int(os.environ.get('KUMA_POMOGATOR_ARTIFACT_MAX_AGE', 900))
+
+# (column, dotted path in the API object) of the default export columns,
+# any other field of the object can be selected by its path
+ALERTS_COLUMNS = [('name', 'name'), ('id', 'id'), ('status', 'status'), ('first_seen', 'firstSeen'), ('last_seen', 'lastSeen'),
+                  ('assignee', 'assignee'), ('tenantName', 'tenantName'), ('tenantID', 'tenantID')]
+INCIDENTS_COLUMNS = [('name', 'name'), ('id', 'id'), ('status', 'status'), ('first_seen', 'createdAt'), ('last_seen', 'updatedAt'),
+                     ('assignee', 'assigneeName'), ('tenantName', 'tenantName'), ('tenantID', 'tenantID')]
+ALERTS_HEADER = [column for column, _ in ALERTS_COLUMNS]
+INCIDENTS_HEADER = [column for column, _ in INCIDENTS_COLUMNS]
+ASSETS_HEADER = ['name', 'fqdn', 'ipAddresses', 'macAddresses', 'osName', 'osVersion']
+
+RESOURCE_KINDS = ["collector", "correlator", "storage", "activeList", "aggregationRule", "connector", 
+                  "correlationRule", "dictionary", "enrichmentRule", "destination", "filter", "normalizer", 
+                  "responseRule", "search", "agent", "proxy", "secret", "contextTable", "emailTemplate", 
+                  "segmentationRule", "eventRouter"]
+
+IPV4_RE = re.compile(r'(?:(?:25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)\.){3}(?:25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)')
+MAC_RE = re.compile(r'[0-9A-Fa-f]{2}([:-])(?:[0-9A-Fa-f]{2}\1){4}[0-9A-Fa-f]{2}')
+JSONPATH_TOKEN_RE = re.compile(r"\.\.(?P<deep>[^.\[]+)|\.(?P<key>[^.\[]+)|\['(?P<quoted>[^']*)'\]|\[(?P<index>-?\d+)\]|\[(?P<star>\*)\]")
+ENDPOINT_ID_RE = re.compile(r'/(?:[0-9a-fA-F]{8}-?(?:[0-9a-fA-F]{4}-?){3}[0-9a-fA-F]{12}|\d+)(?=/|$)')
+FQDN_RE = re.compile(r'(?=.{1,253}\.?$)(?:(?!-)[A-Za-z0-9-]{1,63}(?<!-)\.)*(?!-)[A-Za-z0-9-]{1,63}(?<!-)\.?')
+
+
+class UploadReader:
+
+    # File-like body for streamed uploads: requests takes Content-Length
+    # from __len__ and urllib3 sends the file in blocks through read(),
+    # so only one block at a time is in memory
+    def __init__(self, path, callback=None, report_every=1024 * 1024):
+
+        self.file = open(path, 'rb')
+        self.total = os.path.getsize(path)
+        self.sent = 0
+        self.reported = 0
+        self.callback = callback
+        self.report_every = report_every
+
+    def __len__(self):
+        return self.total
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(self.report_every)
+            if not chunk:
+                break
+            yield chunk
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.file.close()
+
+    def rewind(self):
+        # before a retry, the previous attempt may have read it all
+        self.file.seek(0)
+        self.sent = 0
+        self.reported = 0
+
+    def read(self, size=-1):
+
+        chunk = self.file.read(size)
+        self.sent = self.sent + len(chunk)
+
+        if self.callback and chunk and (self.sent - self.reported >= self.report_every or self.sent == self.total):
+            self.reported = self.sent
+            self.callback(self.sent, self.total)
+
+        return chunk
+
+
+class TTLCache:
+
+    # Thread-safe mapping whose entries expire ttl seconds after being set.
+    # Once maxsize is reached the least recently used entry is evicted.
+    def __init__(self, ttl=300, maxsize=128):
+
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.data.get(key)
+            if entry is None:
+                return None
+
+            expires, value = entry
+            if expires < monotonic():
+                del self.data[key]
+                return None
+
+            self.data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.ttl <= 0:
+            return
+
+        with self.lock:
+            self.data[key] = (monotonic() + self.ttl, value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def invalidate(self, name=None):
+
+        # Keys are tuples starting with the cached method's name, without
+        # a name everything is dropped
+        with self.lock:
+            if name is None:
+                self.data.clear()
+            else:
+                for key in [key for key in self.data if key[0] == name]:
+                    del self.data[key]
+
+
+class RateController:
+
+    # Paces the API calls to one core, shared by every client of that core
+    # in the process (see rate_controller). Every endpoint (method and
+    # path with ids masked) has an AIMD limit of requests in flight: it
+    # grows by about one per round of successful calls and halves, at most
+    # once per round trip, on 429, 5xx, network errors or when latency
+    # climbs well above the best seen. Retry-After of a 429/503 holds the
+    # endpoint back, and max_rps, if set, caps the requests per second of
+    # the whole core with a token bucket.
+    def __init__(self, max_rps=0, initial=4, max_limit=16, latency_factor=3.0, max_retry_after=300):
+
+        self.max_rps = max_rps
+        self.initial = min(initial, max_limit)
+        self.max_limit = max(1, max_limit)
+        self.latency_factor = latency_factor
+        self.max_retry_after = max_retry_after
+        self.condition = threading.Condition()
+        self.endpoints = {}
+        # the bucket holds one second worth of requests
+        self.capacity = max(1.0, max_rps)
+        self.tokens = self.capacity
+        self.refilled = monotonic()
+
+    def endpoint(self, method, url, api_version):
+        path = url.split(api_version, 1)[-1].split('?', 1)[0]
+        return f"{method.upper()} {ENDPOINT_ID_RE.sub('/:id', path)}"
+
+    def _state(self, endpoint):
+        state = self.endpoints.get(endpoint)
+        if state is None:
+            state = self.endpoints[endpoint] = {
+                'limit': float(self.initial),
+                'inflight': 0,
+                'latency': None,
+                'best': None,
+                'blocked_until': 0.0,
+                'decreased': 0.0
+            }
+        return state
+
+    def acquire(self, endpoint):
+
+        # Blocks until the endpoint has a free slot, is not held back by
+        # Retry-After and the bucket has a token. Returns the start time
+        # to be passed to release().
+        with self.condition:
+            state = self._state(endpoint)
+            while True:
+                now = monotonic()
+                delay = state['blocked_until'] - now
+                if delay <= 0 and state['inflight'] < int(state['limit']):
+                    if not self.max_rps:
+                        break
+                    self.tokens = min(self.capacity, self.tokens + (now - self.refilled) * self.max_rps)
+                    self.refilled = now
+                    if self.tokens >= 1:
+                        self.tokens = self.tokens - 1
+                        break
+                    delay = (1 - self.tokens) / self.max_rps
+                # a release() wakes everyone up, so waiting on a full endpoint needs no timeout
+                self.condition.wait(delay if delay > 0 else None)
+
+            state['inflight'] = state['inflight'] + 1
+
+        return monotonic()
+
+    def release(self, endpoint, started, response=None):
+
+        # response is None when the request failed without one
+        now = monotonic()
+        latency = now - started
+        overloaded = response is None or response.status_code == 429 or response.status_code >= 500
+
+        with self.condition:
+            state = self._state(endpoint)
+            state['inflight'] = state['inflight'] - 1
+
+            if response is not None and response.status_code in (429, 503):
+                state['blocked_until'] = max(state['blocked_until'], now + self.retry_after(response))
+
+            if response is not None and not overloaded:
+                state['best'] = latency if state['best'] is None else min(latency, state['best'] * 1.01)
+                state['latency'] = latency if state['latency'] is None else 0.8 * state['latency'] + 0.2 * latency
+                # the absolute second keeps millisecond jitter of tiny pages from counting as congestion
+                overloaded = state['latency'] > max(self.latency_factor * state['best'], state['best'] + 1.0)
+
+            if overloaded:
+                if now - state['decreased'] > (state['latency'] or latency):
+                    state['limit'] = max(1.0, state['limit'] / 2)
+                    state['decreased'] = now
+            elif response is not None and response.status_code < 400:
+                state['limit'] = min(float(self.max_limit), state['limit'] + 1 / state['limit'])
+
+            self.condition.notify_all()
+
+    def retry_after(self, response):
+
+        # Retry-After is either seconds or an HTTP date, without it wait a second
+        value = response.headers.get('Retry-After')
+        try:
+            delay = float(value)
+        except (TypeError, ValueError):
+            try:
+                delay = parsedate_to_datetime(value).timestamp() - time()
+            except (TypeError, ValueError):
+                delay = 1.0
+        return min(max(delay, 0.0), self.max_retry_after)
+
+    def describe(self):
+        with self.condition:
+            return {endpoint: dict(state) for endpoint, state in self.endpoints.items()}
+
+
+rate_controllers = {}
+rate_controllers_lock = threading.Lock()
+
+
+def rate_controller(core):
+
+    # One controller per core for the whole process, so the pacing holds
+    # no matter how many sessions, jobs or fleets talk to the core
+    with rate_controllers_lock:
+        if core not in rate_controllers:
+            rate_controllers[core] = RateController(max_rps=MAX_RPS, max_limit=MAX_INFLIGHT)
+        return rate_controllers[core]
+
+
+def json_decoder(backend=JSON_BACKEND):
+
+    # Decoder for API bodies and NDJSON lines, bytes or str. orjson parses
+    # big pages and resources several times faster than the stdlib.
+    if backend == 'stdlib' or (backend == 'auto' and orjson is None):
+        return json.loads
+    if orjson is None:
+        raise ImportError("KUMA_POMOGATOR_JSON=orjson, but orjson is not installed")
+    return orjson.loads
+
+
+decode_json = json_decoder()
+
+
+def json_encoder(backend=JSON_BACKEND):
+
+    # Encoder for NDJSON export lines, returns str without the newline
+    if backend == 'stdlib' or (backend == 'auto' and orjson is None):
+        return lambda value: json.dumps(value, ensure_ascii=False)
+    if orjson is None:
+        raise ImportError("KUMA_POMOGATOR_JSON=orjson, but orjson is not installed")
+    return lambda value: orjson.dumps(value).decode()
+
+
+encode_json = json_encoder()
+
+
+def iter_json_items(response, prefix):
+
+    # Yields the items of the array at prefix (ijson notation, e.g.
+    # 'payload.rules.item') of a stream=True response. With ijson only the
+    # current item is built, so a large body is never held as a whole
+    # object tree, without it the body is decoded at once.
+    if ijson is not None:
+        response.raw.decode_content = True
+        yield from ijson.items(response.raw, prefix, use_float=True)
+        return
+
+    node = decode_json(response.content)
+    for key in prefix.split('.')[:-1]:
+        node = node[key]
+    yield from node
+
+
+class Metrics:
+
+    # Process-wide counters and histograms in the Prometheus text format,
+    # see render(). Labels are tuples of (name, value) pairs. Gauges are
+    # not stored, collectors are called at scrape time and return
+    # (name, labels, value) for the current state.
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+    HELP = {
+        'kuma_api_requests_total': ('counter', "KUMA API requests by response code or exception"),
+        'kuma_api_request_duration_seconds': ('histogram', "KUMA API request latency, time to response headers"),
+        'kuma_api_throttle_wait_seconds': ('histogram', "Time requests waited for the rate controller"),
+        'kuma_api_response_bytes_total': ('counter', "KUMA API response bytes"),
+        'kuma_api_retries_total': ('counter', "KUMA API requests repeated after 5xx, 429 or network errors"),
+        'kuma_api_pages_total': ('counter', "List pages fetched"),
+        'kuma_api_rows_total': ('counter', "List items fetched"),
+        'kuma_api_inflight': ('gauge', "KUMA API requests in flight"),
+        'kuma_api_concurrency_limit': ('gauge', "Requests in flight allowed by the rate controller"),
+        'kuma_jobs_total': ('counter', "Finished jobs by status"),
+        'kuma_job_duration_seconds': ('histogram', "Job run time"),
+    }
+
+    def __init__(self):
+
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.collectors = []
+
+    def inc(self, name, labels, value=1):
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[labels] = series.get(labels, 0) + value
+
+    def observe(self, name, labels, value):
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            # per bucket counts (not cumulative), then sum and count
+            counts = series.setdefault(labels, [0] * (len(self.BUCKETS) + 2))
+            for i, bound in enumerate(self.BUCKETS):
+                if value <= bound:
+                    counts[i] = counts[i] + 1
+                    break
+            counts[-2] = counts[-2] + value
+            counts[-1] = counts[-1] + 1
+
+    def render(self):
+
+        lines = []
+        gauges = {}
+        for collector in self.collectors:
+            for name, labels, value in collector():
+                gauges.setdefault(name, {})[labels] = value
+
+        with self.lock:
+            for name in self.HELP:
+                kind, text = self.HELP[name]
+                series = self.counters.get(name) or self.histograms.get(name) or gauges.get(name)
+                if not series:
+                    continue
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in series.items():
+                    if kind != 'histogram':
+                        lines.append(f"{name}{format_labels(labels)} {value}")
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(self.BUCKETS, value):
+                        cumulative = cumulative + count
+                        lines.append(f"{name}_bucket{format_labels(labels + (('le', bound),))} {cumulative}")
+                    lines.append(f"{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {value[-1]}")
+                    lines.append(f"{name}_sum{format_labels(labels)} {value[-2]}")
+                    lines.append(f"{name}_count{format_labels(labels)} {value[-1]}")
+
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    pairs = []
+    for name, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+class JobTiming:
+
+    # API work of one job by endpoint. Collected through the job_timing
+    # context variable, so every thread working for the job has to be
+    # started with submit_in_context.
+    FIELDS = ('requests', 'errors', 'retries', 'pages', 'rows', 'bytes', 'seconds', 'wait_seconds')
+
+    def __init__(self):
+
+        self.lock = threading.Lock()
+        self.endpoints = {}
+
+    def add(self, endpoint, **values):
+        with self.lock:
+            totals = self.endpoints.setdefault(endpoint, dict.fromkeys(self.FIELDS, 0))
+            for field, value in values.items():
+                totals[field] = totals[field] + value
+
+    def summary(self):
+        with self.lock:
+            endpoints = {endpoint: dict(totals) for endpoint, totals in self.endpoints.items()}
+        total = {field: sum(totals[field] for totals in endpoints.values()) for field in self.FIELDS}
+        for totals in list(endpoints.values()) + [total]:
+            totals['seconds'] = round(totals['seconds'], 3)
+            totals['wait_seconds'] = round(totals['wait_seconds'], 3)
+        return {'total': total, 'endpoints': endpoints}
+
+
+metrics = Metrics()
+job_timing = contextvars.ContextVar('job_timing', default=None)
+
+
+def submit_in_context(executor, fn, *args):
+    # executor threads do not inherit context variables by themselves
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+def record_request(core, endpoint, seconds, wait_seconds, response=None, error=None):
+
+    # Metrics and job timing of one HTTP request, response is None when it
+    # failed with the exception error
+    if response is not None:
+        code = str(response.status_code)
+        failed = response.status_code >= 400
+        history = getattr(getattr(response.raw, 'retries', None), 'history', None) or ()
+        if response.raw is None or getattr(response, '_content_consumed', False):
+            size = len(response.content or b'')
+        else:
+            # streamed bodies are not read yet
+            size = int(response.headers.get('Content-Length') or 0)
+    else:
+        code = type(error).__name__
+        failed = True
+        history = ()
+        size = 0
+
+    labels = (('core', core), ('endpoint', endpoint))
+    metrics.inc('kuma_api_requests_total', labels + (('code', code),))
+    metrics.observe('kuma_api_request_duration_seconds', labels, seconds)
+    metrics.observe('kuma_api_throttle_wait_seconds', labels, wait_seconds)
+    metrics.inc('kuma_api_response_bytes_total', labels, size)
+    if history:
+        metrics.inc('kuma_api_retries_total', labels, len(history))
+
+    timing = job_timing.get()
+    if timing is not None:
+        timing.add(endpoint, requests=1, errors=int(failed), retries=len(history), bytes=size,
+                   seconds=seconds, wait_seconds=wait_seconds)
+
+
+def record_page(core, endpoint, rows):
+    labels = (('core', core), ('endpoint', endpoint))
+    metrics.inc('kuma_api_pages_total', labels)
+    metrics.inc('kuma_api_rows_total', labels, rows)
+    timing = job_timing.get()
+    if timing is not None:
+        timing.add(endpoint, pages=1, rows=rows)
+
+
+def collect_controllers():
+    with rate_controllers_lock:
+        controllers = list(rate_controllers.items())
+    for core, controller in controllers:
+        for endpoint, state in controller.describe().items():
+            labels = (('core', core), ('endpoint', endpoint))
+            yield 'kuma_api_inflight', labels, state['inflight']
+            yield 'kuma_api_concurrency_limit', labels, int(state['limit'])
+
+
+metrics.collectors.append(collect_controllers)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = metrics.render().encode('utf8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port, host=METRICS_HOST):
+    # Prometheus endpoint next to the web interface, on its own port
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True, name='metrics').start()
+    return server
+
+
+class ResourceIndex:
+
+    # Local mirror of /resources metadata (id, name, kind, tenant) of one
+    # core for the Analyzer search. A background thread syncs every kind
+    # and re-syncs them every refresh seconds. A kind is swapped in as a
+    # whole once its listing is complete, so searches never see it half
+    # synced and keep working on the previous copy meanwhile.
+    def __init__(self, kuma, refresh=600):
+
+        self.kuma = kuma
+        self.refresh = refresh
+        # clients sharing the index, see resource_index
+        self.users = 0
+        self.kinds = {}
+        self.synced = {}
+        self.lock = threading.Lock()
+        self.stop_event = None
+
+    def start(self):
+
+        self.stop()
+        with self.lock:
+            self.kinds = {}
+            self.synced = {}
+
+        if self.refresh <= 0:
+            return
+
+        self.stop_event = threading.Event()
+        threading.Thread(target=self._run, args=(self.stop_event,), daemon=True).start()
+
+    def stop(self):
+        if self.stop_event:
+            self.stop_event.set()
+
+    def _run(self, stop_event):
+        while not stop_event.is_set():
+            for kind in RESOURCE_KINDS:
+                if stop_event.is_set():
+                    return
+                self.sync_kind(kind)
+            stop_event.wait(self.refresh)
+
+    def sync_kind(self, kind):
+
+        entries = {}
+        for result, resources_batch in self.kuma.iter_resources(kind):
+            for r in resources_batch:
+                entries[r['id']] = (r['name'], r['kind'], r['tenantName'], r['tenantID'])
+
+        if result['status'] == self.kuma.OK:
+            with self.lock:
+                self.kinds[kind] = entries
+                self.synced[kind] = monotonic()
+
+        return result
+
+    def is_synced(self, kind, max_age=None):
+
+        # With max_age a kind synced longer ago than that does not count
+        with self.lock:
+            kinds = [kind] if kind else RESOURCE_KINDS
+            return all(kind in self.synced and (max_age is None or monotonic() - self.synced[kind] <= max_age)
+                       for kind in kinds)
+
+    def search(self, kind=None, name=None, tenant_id=None):
+
+        # Same choices as Kuma.get_resources_list, name is a regular expression
+        pattern = re.compile(name) if name else None
+        with self.lock:
+            kinds = [self.kinds.get(kind, {})] if kind else list(self.kinds.values())
+
+        resources = []
+        for entries in kinds:
+            for id, (resource_name, resource_kind, tenant_name, resource_tenant_id) in entries.items():
+                if tenant_id and resource_tenant_id != tenant_id:
+                    continue
+                if pattern and not pattern.search(resource_name):
+                    continue
+                resources.append((resource_name + '; ' + tenant_name, resource_kind + ';' + id))
+
+        return sorted(resources)
+
+    def size(self):
+        with self.lock:
+            return sum(len(entries) for entries in self.kinds.values())
+
+
+resource_indexes = {}
+resource_indexes_lock = threading.Lock()
+
+
+def resource_index(kuma):
+
+    # One index per core and token for the whole process, however many
+    # sessions are connected with them. It lists resources through a
+    # client of its own, so it outlives the client that started it.
+    with resource_indexes_lock:
+        index = resource_indexes.get(kuma.identity)
+        if index is not None:
+            index.users = index.users + 1
+            return index
+
+    # connecting takes a request, other sessions must not wait for it
+    client = Kuma(pool_size=kuma.workers, workers=kuma.workers, cache_ttl=0, index_refresh=0, scheme=kuma.scheme)
+    client.connect(kuma.address, kuma.port, kuma.token)
+    with resource_indexes_lock:
+        index = resource_indexes.get(kuma.identity)
+        if index is None:
+            index = resource_indexes[kuma.identity] = ResourceIndex(client, refresh=kuma.index_refresh)
+            index.start()
+            client = None
+        index.users = index.users + 1
+
+    # another session was faster
+    if client is not None:
+        client.close()
+    return index
+
+
+def release_resource_index(index):
+
+    # Stops a shared index once its last client is closed, a client's own
+    # empty index is not in the registry and is left alone
+    key = getattr(index.kuma, 'identity', None)
+    with resource_indexes_lock:
+        if key is None or resource_indexes.get(key) is not index:
+            return
+        index.users = index.users - 1
+        if index.users > 0:
+            return
+        del resource_indexes[key]
+
+    index.stop()
+    index.kuma.close()
+
+
+class SnapshotStore:
+
+    # Nightly configuration snapshots. Every snapshot is a directory
+    # <core>/<timestamp> holding its resource index twice, sorted by id
+    # (by_id.ndjson) and by kind, tenant and name (by_name.ndjson), so two
+    # snapshots can be diffed by a streaming merge. Bodies are canonical
+    # JSON stored once per content hash under objects/, shared by all
+    # snapshots and cores.
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def core_name(self, address, port):
+        return re.sub(r'[^A-Za-z0-9.-]', '_', f"{address}_{port}")
+
+    def list(self, identity=None):
+
+        # With identity only the snapshots taken with that core and token,
+        # the manifest keeps who took the snapshot
+        snapshots = []
+        for path in self.root.glob('*/*/manifest.json'):
+            if identity is not None:
+                with open(path, encoding='utf8') as f:
+                    if json.load(f).get('identity') != identity:
+                        continue
+            snapshots.append(str(path.parent.relative_to(self.root)))
+        return sorted(snapshots)
+
+    def latest(self, core):
+        snapshots = sorted(path.parent for path in (self.root / core).glob('*/by_id.ndjson'))
+        return snapshots[-1] if snapshots else None
+
+    def load_index(self, snapshot):
+        # id -> entry, to skip re-downloading unchanged bodies and to keep
+        # the resources a new snapshot failed to read
+        index = {}
+        if snapshot:
+            with open(snapshot / 'by_id.ndjson', encoding='utf8') as f:
+                for line in f:
+                    entry = decode_json(line)
+                    index[entry['id']] = entry
+        return index
+
+    def object_path(self, digest):
+        return self.root / 'objects' / digest[:2] / (digest + '.json.gz')
+
+    def write_object(self, resource):
+
+        # Returns the content hash, the body is written only if it is new
+        canonical = json.dumps(resource, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf8')
+        digest = hashlib.sha256(canonical).hexdigest()
+        path = self.object_path(digest)
+
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = path.with_suffix('.tmp')
+            with gzip.open(temp_path, 'wb') as f:
+                f.write(canonical)
+            os.replace(temp_path, path)
+
+        return digest
+
+    def write_snapshot(self, core, entries, manifest):
+
+        # two snapshots of a core (other tokens) may be taken in one second
+        name = strftime('%Y%m%dT%H%M%S')
+        snapshot = self.root / core / name
+        number = 1
+        while True:
+            try:
+                snapshot.mkdir(parents=True)
+                break
+            except FileExistsError:
+                snapshot = self.root / core / f"{name}-{number}"
+                number = number + 1
+
+        for name, key in (('by_id.ndjson', snapshot_key_id), ('by_name.ndjson', snapshot_key_name)):
+            with open(snapshot / name, 'w', encoding='utf8') as f:
+                for entry in sorted(entries, key=key):
+                    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+        with open(snapshot / 'manifest.json', 'w', encoding='utf8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+        return snapshot
+
+
+def snapshot_key_id(entry):
+    return entry['id']
+
+
+def snapshot_key_name(entry):
+    return (entry['kind'], entry['tenantName'], entry['name'])
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+
+    # One long-running operation. The job's function reports progress
+    # through report(), which is also where a cancelled job stops.
+    # On success path is the result file (if any), details the message
+    # for the user and output whatever else the UI needs to show.
+    def __init__(self, name, owner=None):
+
+        self.id = uuid4().hex[:12]
+        self.name = name
+        self.owner = owner
+        self.status = 'queued'
+        self.progress = None
+        self.path = None
+        self.details = ''
+        self.warning = False
+        self.output = None
+        self.created = time()
+        self.started = None
+        self.finished = None
+        self.cancel_event = threading.Event()
+        self.done_event = threading.Event()
+        self.timing = JobTiming()
+        # set by JobManager, without a store results go to the temp directory
+        self.store = None
+        self.cache_key = None
+        self.reused = False
+        self.args = ()
+
+    def report(self, done, total=None, desc=None, unit='steps'):
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+        self.progress = (done, total, desc, unit)
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def new_path(self, stem, extension):
+
+        # Result file named <stem>_<time><extension>, the name the user
+        # gets on download
+        stem = re.sub(r'[^A-Za-z0-9.-]', '_', stem) + strftime('_%Y%m%d_%H%M%S')
+        if self.store is None:
+            return new_temp_path(stem + '_', extension)
+        return self.store.new_path(stem + extension)
+
+    def reuse(self, operation, core, *params):
+
+        # Returns True and takes the result of an identical job from the
+        # artifact store if one finished less than max_age ago, otherwise
+        # remembers the key under which this job's result will be kept
+        if self.store is None:
+            return False
+        self.cache_key = artifact_key(operation, core, *params)
+        found = self.store.lookup(self.cache_key)
+        if found is None:
+            return False
+
+        self.path, created = found
+        self.reused = True
+        self.details = f"Identical result from {strftime('%H:%M:%S', localtime(created))} reused, the core was not queried"
+        return True
+
+    def summary(self):
+
+        # Structured timing of the job: queue and run time, rows per second
+        # of exports and the API work by endpoint
+        end = self.finished or time()
+        summary = {
+            'id': self.id,
+            'job': self.name,
+            'status': self.status,
+            'queued_seconds': round((self.started or end) - self.created, 3),
+            'run_seconds': round(end - self.started, 3) if self.started else 0,
+            'api': self.timing.summary()
+        }
+        if self.progress and self.progress[3] == 'rows':
+            summary['rows'] = self.progress[0]
+            summary['rows_per_second'] = round(self.progress[0] / summary['run_seconds'], 1) if summary['run_seconds'] else None
+        return summary
+
+    def describe_progress(self):
+        if not self.progress:
+            return ''
+        done, total, desc, unit = self.progress
+        if unit == 'bytes':
+            done, total, unit = round(done / 2**20, 1), total and round(total / 2**20, 1), 'MiB'
+        text = f"{done} / {total} {unit}" if total else f"{done} {unit}"
+        return f"{desc}: {text}" if desc else text
+
+
+class JobManager:
+
+    # Runs jobs on a bounded executor, so many concurrent users queue up
+    # instead of starving each other, and keeps the last keep jobs to be
+    # polled, re-attached to or cancelled by id
+    def __init__(self, workers=4, keep=100, store=None):
+
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self.keep = keep
+        self.store = store
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def submit(self, name, fn, *args, owner=None):
+
+        # fn(job, *args) does the work and returns a Kuma result dict
+        job = Job(name, owner)
+        job.store = self.store
+        job.args = args
+        with self.lock:
+            self.jobs[job.id] = job
+            finished = [job_id for job_id, old in self.jobs.items() if old.done_event.is_set()]
+            for job_id in finished[:max(0, len(self.jobs) - self.keep)]:
+                del self.jobs[job_id]
+
+        self.executor.submit(self._run, job, fn, args)
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get((job_id or '').strip())
+
+    def list(self, owner=None):
+        with self.lock:
+            return [job for job in reversed(self.jobs.values()) if owner is None or job.owner == owner]
+
+    def close_when_idle(self, client):
+
+        # Closes a client the session no longer uses (reconnect, expired
+        # session) once the jobs still working with it are finished
+        with self.lock:
+            busy = [job for job in self.jobs.values()
+                    if not job.done_event.is_set() and any(arg is client for arg in job.args)]
+        if not busy:
+            client.close()
+            return
+
+        def close():
+            for job in busy:
+                job.done_event.wait()
+            client.close()
+        threading.Thread(target=close, daemon=True).start()
+
+    def _run(self, job, fn, args):
+
+        try:
+            if job.cancel_event.is_set():
+                raise JobCancelled()
+
+            job.status = 'running'
+            job.started = time()
+            # the executor thread is reused, the variable must not leak into the next job
+            token = job_timing.set(job.timing)
+            try:
+                result = fn(job, *args)
+            finally:
+                job_timing.reset(token)
+
+            if job.cancel_event.is_set():
+                raise JobCancelled()
+
+            if result['status'] == 'OK':
+                job.status = 'done'
+            else:
+                job.status = 'failed'
+                job.details = result['details']
+
+        except JobCancelled:
+            job.status = 'cancelled'
+            job.details = 'Cancelled'
+
+        except Exception as e:
+            job.status = 'failed'
+            job.details = str(e)
+
+        finally:
+            # waiters block on done_event, it is set whatever happens here
+            try:
+                self._keep_result(job)
+            except Exception as e:
+                job.status = 'failed'
+                job.details = f"The result could not be stored: {e}"
+                job.path = None
+            finally:
+                job.finished = time()
+                metrics.inc('kuma_jobs_total', (('job', job.name), ('status', job.status)))
+                metrics.observe('kuma_job_duration_seconds', (('job', job.name),), job.finished - (job.started or job.finished))
+                job.done_event.set()
+
+    def _keep_result(self, job):
+
+        # Registers the result file of a done job in the store, removes the
+        # file of a job that did not finish
+        if job.path and job.store is not None:
+            if job.status == 'done':
+                job.store.add(job.path, job.cache_key)
+            else:
+                # a reused result belongs to the job that made it
+                if not job.reused:
+                    job.store.discard(job.path)
+                job.path = None
+        elif job.status != 'done' and job.path and os.path.exists(job.path):
+            os.remove(job.path)
+            job.path = None
+
+
+class WatermarkStore:
+
+    # Newest exported timestamp per tenant for every incremental export
+    # scope (core, kind, status filter), kept in a JSON file so that it
+    # survives restarts
+    def __init__(self, path):
+
+        self.path = Path(path)
+        self.lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding='utf8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def get(self, scope):
+        with self.lock:
+            return self._load().get(scope, {})
+
+    def update(self, scope, watermarks):
+        with self.lock:
+            data = self._load()
+            data.setdefault(scope, {}).update(watermarks)
+
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = self.path.with_suffix('.tmp')
+            with open(temp_path, 'w', encoding='utf8') as f:
+                json.dump(data, f, indent=2)
+            os.replace(temp_path, self.path)
+
+
+class ArtifactStore:
+
+    # Result files of jobs and downloads. Every file lives in a directory
+    # of its own under root, so it keeps a readable name, and index.json
+    # holds its key, size, creation and last use. A result with a key
+    # (operation, core and parameters) is reused by an identical job for
+    # max_age seconds. Once the files take more than quota bytes the
+    # least recently used ones are removed.
+    def __init__(self, root, quota, max_age):
+
+        self.root = Path(root)
+        self.quota = quota
+        self.max_age = max_age
+        self.lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.root / 'index.json', encoding='utf8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save(self, index):
+        temp_path = self.root / 'index.tmp'
+        with open(temp_path, 'w', encoding='utf8') as f:
+            json.dump(index, f, indent=2)
+        os.replace(temp_path, self.root / 'index.json')
+
+    def new_path(self, name):
+        directory = self.root / uuid4().hex
+        directory.mkdir(parents=True)
+        return str(directory / name)
+
+    def add(self, path, key=None):
+
+        # Registers a finished file (again, if it is already known) and
+        # makes room for it
+        path = Path(path)
+        with self.lock:
+            index = self._load()
+            entry = index.get(path.parent.name) or {'name': path.name, 'key': key, 'size': path.stat().st_size, 'created': time()}
+            entry['used'] = time()
+            index[path.parent.name] = entry
+            self._evict(index, path.parent.name)
+            self._save(index)
+        return str(path)
+
+    def lookup(self, key):
+
+        # (path, created) of the newest fresh file with key or None
+        if not self.max_age:
+            return None
+        with self.lock:
+            index = self._load()
+            fresh = [(entry['created'], artifact_id) for artifact_id, entry in index.items()
+                     if entry['key'] == key and time() - entry['created'] < self.max_age
+                     and (self.root / artifact_id / entry['name']).exists()]
+            if not fresh:
+                return None
+            created, artifact_id = max(fresh)
+            index[artifact_id]['used'] = time()
+            self._save(index)
+        return str(self.root / artifact_id / index[artifact_id]['name']), created
+
+    def invalidate(self):
+
+        # No stored result is reused any more, the files stay until they
+        # are evicted as they may still be downloaded from the Jobs tab
+        with self.lock:
+            index = self._load()
+            if not index:
+                return
+            for entry in index.values():
+                entry['key'] = None
+            self._save(index)
+
+    def discard(self, path):
+        path = Path(path)
+        if path.parent.parent != self.root:
+            return
+        with self.lock:
+            index = self._load()
+            if index.pop(path.parent.name, None) is not None:
+                self._save(index)
+        shutil.rmtree(path.parent, ignore_errors=True)
+
+    def _evict(self, index, keep):
+        total = sum(entry['size'] for entry in index.values())
+        for artifact_id, entry in sorted(index.items(), key=lambda item: item[1]['used']):
+            if total <= self.quota:
+                break
+            if artifact_id == keep:
+                continue
+            shutil.rmtree(self.root / artifact_id, ignore_errors=True)
+            del index[artifact_id]
+            total = total - entry['size']
+
+    def cleanup(self, orphan_age=86400):
+
+        # Forgets files removed by hand and removes directories that never
+        # made it into the index (jobs interrupted by a restart). Another
+        # process may still be writing a fresh one, so only old ones go.
+        if not self.root.exists():
+            return
+        with self.lock:
+            index = self._load()
+            index = {artifact_id: entry for artifact_id, entry in index.items()
+                     if (self.root / artifact_id / entry['name']).exists()}
+            for directory in self.root.iterdir():
+                if directory.is_dir() and directory.name not in index and time() - directory.stat().st_mtime > orphan_age:
+                    shutil.rmtree(directory, ignore_errors=True)
+            self._evict(index, None)
+            self._save(index)
+
+
+def artifact_key(operation, core, *params):
+    # datetimes and tuples of column definitions as their JSON text
+    canonical = json.dumps([operation, core, params], default=str, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf8')).hexdigest()
+
+
+class Kuma:
+    
+    def __init__(self, pool_size=10, timeout=(10, 300), retries=3, backoff_factor=0.5, workers=4,
+                 cache_ttl=300, cache_size=128, index_refresh=600, scheme='https'):
+        
+        # plain http is only for local stand-ins of the API, see mock_kuma.py
+        self.scheme = scheme
+        self.api_version = '/api/v3'
+        self.verifiy = False
+        self.limit = 250
+        # a time window needing more pages than this is split in two, see _iter_windows
+        self.window_pages = 40
+        self.OK =  'OK'
+        self.ERROR = 'ERROR'
+        # pages in flight per list call, every one of them needs a pooled connection
+        self.workers = max(1, workers)
+        self.pool_size = max(pool_size, self.workers)
+        # (connect, read) timeouts in seconds, see requests docs
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.session = self._make_session()
+        # tenants, correlators and resource listings for dropdowns and search
+        self.cache = TTLCache(ttl=cache_ttl, maxsize=cache_size)
+        # full resource bodies for the Analyzer, they can be megabytes each
+        self.resource_cache = TTLCache(ttl=cache_ttl, maxsize=16)
+        # Analyzer index, shared with the other clients of the same core
+        # and token once connected, see resource_index
+        self.index_refresh = index_refresh
+        self.index = ResourceIndex(self, refresh=0)
+
+    def _make_session(self):
+
+        # urllib3 only retries connections that could not be established,
+        # such a request never reached the core. Retries of answered
+        # requests are made by _make_request, so every attempt is paced
+        # by the RateController and honours Retry-After.
+        retry = Retry(
+            total=self.retries,
+            connect=self.retries,
+            read=0,
+            status=0,
+            other=0,
+            backoff_factor=self.backoff_factor,
+            raise_on_status=False,
+            respect_retry_after_header=False
+        )
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=retry)
+
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.verify = self.verifiy
+
+        return session
+
+    def close(self):
+        release_resource_index(self.index)
+        self.index = ResourceIndex(self, refresh=0)
+        self.session.close()
+           
+    def connect(self, address, port, token):
+        
+        self.address = address
+        self.port = port
+        self.token = token
+        self.headers = {"Authorization" : "Bearer " + self.token}
+        self.session.headers.update(self.headers)
+        # who is connected where, without keeping the token around in clear
+        self.identity = hashlib.sha256(f"{address}:{port}:{token}".encode('utf8')).hexdigest()[:16]
+        self.cache.invalidate()
+        self.resource_cache.invalidate()
+        self.core = f"{address}:{port}"
+        self.controller = rate_controller(self.core)
+        self.base_url = self.scheme + '://' + self.address + ':' + self.port + self.api_version
+        self.whoami_url = self.base_url + '/users/whoami'
+
+        method = 'get'
+        result, r = self._make_request(method=method, url=self.whoami_url)
+
+        release_resource_index(self.index)
+        self.index = ResourceIndex(self, refresh=0)
+        if result['status'] == self.OK and self.index_refresh > 0:
+            self.index = resource_index(self)
+
+        return result
+
+    def get_core_time(self):
+
+        # The core's clock from the Date header of a cheap request, None
+        # if it cannot be told. The local clock may be off the core's.
+        result, r = self._make_request(method='get', url=self.whoami_url)
+        if result['status'] != self.OK:
+            return None
+        try:
+            return parsedate_to_datetime(r.headers.get('Date')).astimezone(timezone.utc)
+        except (TypeError, ValueError):
+            return None
+  
+    def get_correlators(self):
+        
+        cached = self.cache.get(('correlators',))
+        if cached is not None:
+            return {"status": self.OK, "details": ''}, list(cached)
+
+        correlators = []
+        params = {"kind": "correlator"}
+        services_url = self.base_url + '/services'
+
+        for result, correlators_batch in self._iter_pages(services_url, params):
+            for correlator in correlators_batch:
+                correlators.append(
+                                    (correlator['name']+';'+ correlator['tenantName'], correlator['resourceID'])
+                                    )
+
+        if result['status'] == self.OK:
+            self.cache.set(('correlators',), list(correlators))
+
+        return result, correlators
+
+    def get_rules_from_correlator(self, correlator_id):
+
+        rules = []
+        correlator_url = self.base_url + '/resources/correlator/' + correlator_id
+        method = 'get'
+            
+        # a correlator body can be megabytes, only its rules are needed
+        result, r = self._make_request(method=method, url=correlator_url, stream=True)
+        
+        if result['status'] == self.OK:
+            try:
+                with r:
+                    for rule in iter_json_items(r, 'payload.rules.item'):
+                        rules.append([rule['name'], rule['kind'],  rule['id']])
+            except Exception as e:
+                result['status'] = self.ERROR
+                result['details'] = str(e)
+                rules = []
+ 
+        return result, rules
+
+    def get_rules_from_all_correlators(self):
+
+        # Rules of every correlator of the core, the correlators are
+        # fetched concurrently. Each rule row gets the correlator's
+        # 'name;tenant' label as the last column. A correlator that fails
+        # (deleted meanwhile, no access) is skipped: the result is OK if
+        # any correlator was read, its details name the failed ones.
+        rules = []
+        result, correlators = self.get_correlators()
+        if result['status'] != self.OK:
+            return result, rules
+
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        futures = [submit_in_context(executor, self.get_rules_from_correlator, correlator_id) for _, correlator_id in correlators]
+        failed = []
+
+        try:
+            for (label, _), future in zip(correlators, futures):
+                result, correlator_rules = future.result()
+                if result['status'] != self.OK:
+                    failed.append(f"{label}: {result['details']}")
+                    continue
+                for rule in correlator_rules:
+                    rules.append(rule + [label])
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        status = self.OK if len(failed) < len(correlators) or not correlators else self.ERROR
+        return {"status": status, "details": '; '.join(failed)}, rules
+
+    def get_rules_from_tenant(self, tenant_id):
+        rules = []
+
+        resources_url = self.base_url + "/resources"
+        params = {
+            "kind": "correlationRule",
+            "tenantID": tenant_id
+        }
+
+        for result, rules_batch in self._iter_pages(resources_url, params):
+            for r in rules_batch:
+                rules.append(
+                    [r['name'], r['kind'],  r['id']]
+                )
+
+        return result, rules
+
+    def iter_alerts(self, status=None, time_field=None, start=None, end=None, sharded=False, columns=None):
+
+        # Yields (result, rows), a row holds the values of columns, see
+        # ALERTS_COLUMNS
+        getters = [column_getter(path) for _, path in columns or ALERTS_COLUMNS]
+        window_start, window_end = start, end
+
+        if start:
+            start = start.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+        
+        if end:
+            end = end.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+        alerts_url = self.base_url + '/alerts'
+        params = {
+            "timestampField": time_field,
+            "from": start,
+            "to": end,
+            "status": status
+        }
+
+        if sharded and time_field and window_start and window_end:
+            pages = self._iter_windows(alerts_url, params, window_start, window_end)
+        else:
+            pages = self._iter_pages(alerts_url, params)
+
+        for result, alerts_batch in pages:
+            yield result, [[get(a) for get in getters] for a in alerts_batch]
+
+    def get_alerts_list(self, status=None, time_field=None, start=None, end=None, sharded=False):
+
+        alerts = []
+        for result, alerts_batch in self.iter_alerts(status, time_field, start, end, sharded):
+            alerts.extend(alerts_batch)
+
+        return result, alerts
+
+    def iter_incidents(self, status=None, time_field=None, start=None, end=None, sharded=False, columns=None):
+
+        getters = [column_getter(path) for _, path in columns or INCIDENTS_COLUMNS]
+        window_start, window_end = start, end
+
+        if start:
+            start = start.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+        
+        if end:
+            end = end.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+        
+        incidents_url = self.base_url + '/incidents'
+        params = {
+            "timestampField": time_field,
+            "from": start,
+            "to": end,
+            "status": status
+        }
+
+        if sharded and time_field and window_start and window_end:
+            pages = self._iter_windows(incidents_url, params, window_start, window_end, key='incidents')
+        else:
+            pages = self._iter_pages(incidents_url, params, key='incidents')
+
+        for result, incidents_batch in pages:
+            yield result, [[get(i) for get in getters] for i in incidents_batch]
+
+    def get_incidents_list(self, status=None, time_field=None, start=None, end=None, sharded=False):
+
+        incidents = []
+        for result, incidents_batch in self.iter_incidents(status, time_field, start, end, sharded):
+            incidents.extend(incidents_batch)
+
+        return result, incidents
+
+    def backup(self, path, callback=None, chunk_size=1024 * 1024):
+
+        # The archive is streamed straight to path, callback(written, total)
+        # is called after every chunk, total is None if the core did not
+        # send Content-Length
+        backup_url = self.base_url + '/system/backup'
+        method='get'
+        # the core builds the archive before sending the first byte, so no read timeout here
+        result, r = self._make_request(method=method, url=backup_url, stream=True, timeout=(self.timeout[0], None))
+
+        if result['status'] == self.OK:
+            total = int(r.headers.get('Content-Length', 0)) or None
+            written = 0
+            try:
+                with r, open(path, 'wb') as file:
+                    for chunk in r.iter_content(chunk_size=chunk_size):
+                        file.write(chunk)
+                        written = written + len(chunk)
+                        if callback:
+                            callback(written, total)
+            except Exception as e:
+                result['status'] = self.ERROR
+                result['details'] = str(e)
+
+        return result
+   
+    def restore(self, path, callback=None):
+        
+        # The archive is streamed from path, callback(sent, total) reports
+        # upload progress
+        restore_url = self.base_url + '/system/restore'
+        method = 'post'
+
+        with UploadReader(path, callback=callback) as file:
+            result, r = self._make_request(method=method, url=restore_url, data=file, timeout=(self.timeout[0], None))
+        
+        return result
+    
+    def iter_resources(self, kind=None, name=None, tenant_id=None):
+
+        resources_url = self.base_url + "/resources"
+        params = {
+            "kind": kind,
+            "name": name,
+            "tenantID": tenant_id
+        }
+
+        yield from self._iter_pages(resources_url, params)
+
+    def get_resources_list(self, kind=None, name=None, tenant_id=None):
+
+        cached = self.cache.get(('resources', kind, name, tenant_id))
+        if cached is not None:
+            return {"status": self.OK, "details": ''}, list(cached)
+
+        resources = []
+
+        for result, resources_batch in self.iter_resources(kind, name, tenant_id):
+            for r in resources_batch:
+                resources.append(
+                    (r['name'] + '; ' + r['tenantName'], r['kind'] + ';' + r['id'])
+                )
+
+        if result['status'] == self.OK:
+            self.cache.set(('resources', kind, name, tenant_id), list(resources))
+
+        return result, resources
+    
+    def get_resource(self, kind, id, cache=True):       
+        
+        resource = self.resource_cache.get((kind, id)) if cache else None
+        if resource is not None:
+            return {"status": self.OK, "details": ''}, resource
+
+        resource = {}
+        resource_url  = self.base_url + f'/resources/{kind}/{id}'
+        method = 'get'
+        result, r = self._make_request(method=method, url=resource_url)
+        
+        if result['status'] == self.OK:
+            resource = decode_json(r.content)
+            if cache:
+                self.resource_cache.set((kind, id), resource)
+        
+        return result, resource
+
+    def iter_resource_bodies(self, kinds=RESOURCE_KINDS, skip=None):
+
+        # Yields (result, meta, resource) for every resource of kinds, meta
+        # being its /resources listing entry. Bodies are fetched on the
+        # worker pool with at most 2 * workers of them in flight, so memory
+        # stays flat whatever the number of resources. A kind that cannot
+        # be listed yields (result, {'kind': kind}, {}) and is skipped.
+        # Resources for which skip(meta) is true are not fetched and come
+        # with resource None.
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        pending = deque()
+
+        try:
+            for kind in kinds:
+                for result, resources_batch in self.iter_resources(kind):
+                    for meta in resources_batch:
+                        if skip and skip(meta):
+                            yield {"status": self.OK, "details": ''}, meta, None
+                            continue
+
+                        pending.append((meta, submit_in_context(executor, self.get_resource, meta['kind'], meta['id'], False)))
+
+                        while len(pending) >= 2 * self.workers:
+                            done_meta, future = pending.popleft()
+                            body_result, resource = future.result()
+                            yield body_result, done_meta, resource
+
+                if result['status'] != self.OK:
+                    yield result, {'kind': kind}, {}
+
+            while pending:
+                done_meta, future = pending.popleft()
+                body_result, resource = future.result()
+                yield body_result, done_meta, resource
+        finally:
+            for _, future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+    
+    def import_assets(self, assets, tenant_id):
+
+        assets_url = self.base_url + "/assets/import"
+        params = {
+            "assets": assets,
+            "tenantID": tenant_id
+        }
+        method='post'
+
+        result, r = self._make_request(method=method, url=assets_url, data=json.dumps(params))
+
+        return result
+
+    def _import_batch(self, assets, tenant_id, first, response=None):
+
+        # Imports assets[first:first + len(assets)] and returns
+        # (imported, rejected). A batch the core finds invalid (400, 422)
+        # is bisected until every offending asset is alone, the rest gets
+        # imported. Any other failure (connection errors, 401/403, 429
+        # left after retries, 5xx) is not about the assets, the whole
+        # batch is rejected as is instead of multiplying requests. So is a
+        # batch whose both halves are rejected with the same details: that
+        # is an error of the request (e.g. unknown tenant), not of one asset.
+        # response is the (result, r) of this batch when already posted.
+        assets_url = self.base_url + "/assets/import"
+        method = 'post'
+
+        def post(part):
+            return self._make_request(method=method, url=assets_url, data=json.dumps({"assets": part, "tenantID": tenant_id}))
+
+        def invalid(r):
+            return r is not None and r.status_code in (400, 422)
+
+        result, r = response or post(assets)
+
+        if result['status'] == self.OK:
+            return len(assets), []
+
+        if len(assets) == 1 or not invalid(r):
+            return 0, [(first + i, asset['name'], result['details']) for i, asset in enumerate(assets)]
+
+        middle = len(assets) // 2
+        left = post(assets[:middle])
+        right = post(assets[middle:])
+
+        if invalid(left[1]) and invalid(right[1]) and left[0]['details'] == right[0]['details']:
+            return 0, [(first + i, asset['name'], left[0]['details']) for i, asset in enumerate(assets)]
+
+        imported_left, rejected_left = self._import_batch(assets[:middle], tenant_id, first, left)
+        imported_right, rejected_right = self._import_batch(assets[middle:], tenant_id, first + middle, right)
+
+        return imported_left + imported_right, rejected_left + rejected_right
+
+    def import_assets_batched(self, assets, tenant_id, batch_size=1000, callback=None):
+
+        # Splits assets into batches of batch_size and imports them
+        # concurrently. Returns a report with one dict per batch: first
+        # (index of its first asset), size, imported and rejected, a list
+        # of (index, name, details). callback(done, total) is called after
+        # every finished batch.
+        batch_size = max(1, int(batch_size))
+        starts = range(0, len(assets), batch_size)
+        report = []
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {submit_in_context(executor, self._import_batch, assets[first:first + batch_size], tenant_id, first): first
+                       for first in starts}
+
+            for future in futures:
+                first = futures[future]
+                imported, rejected = future.result()
+                report.append({
+                    "first": first,
+                    "size": min(batch_size, len(assets) - first),
+                    "imported": imported,
+                    "rejected": rejected
+                })
+                if callback:
+                    callback(len(report), len(starts))
+
+        return report
+    
+    def get_tenants(self):
+
+        cached = self.cache.get(('tenants',))
+        if cached is not None:
+            return {"status": self.OK, "details": ''}, list(cached)
+
+        tenants = []
+        tenants_url = self.base_url + "/tenants"
+
+        for result, tenants_batch in self._iter_pages(tenants_url):
+            for t in tenants_batch:
+                tenants.append(
+                    (t['name'], t['id'])
+                )
+
+        if result['status'] == self.OK:
+            self.cache.set(('tenants',), list(tenants))
+
+        return result, tenants
+
+    def _iter_pages(self, url, params=None, key=None):
+
+        # Yields (result, batch) for every page in page order. Starts with
+        # a single page and, while pages come back full, keeps up to
+        # self.workers of the next pages in flight. Stops after the first
+        # short page or the first error.
+        params = dict(params or {})
+        method = 'get'
+
+        def fetch_page(page):
+            result, r = self._make_request(method=method, url=url, params=dict(params, page=page))
+            batch = []
+            if result['status'] == self.OK:
+                batch = decode_json(r.content)
+                if key:
+                    batch = batch[key]
+                record_page(self.core, self.controller.endpoint(method, url, self.api_version), len(batch))
+            return result, batch
+
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        pending = deque([submit_in_context(executor, fetch_page, 1)])
+        next_page = 2
+
+        try:
+            while pending:
+                result, batch = pending.popleft().result()
+
+                if result['status'] != self.OK or len(batch) < self.limit:
+                    yield result, batch
+                    break
+
+                while len(pending) < self.workers:
+                    pending.append(submit_in_context(executor, fetch_page, next_page))
+                    next_page = next_page + 1
+
+                yield result, batch
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def _fetch_window(self, url, params, window_start, window_end, key=None):
+
+        # Pages through one time window. Returns (result, items, dense),
+        # dense means the window has more than self.window_pages full pages
+        # and is wide enough to be split. That is found out by probing the
+        # first page past the limit before anything else, so a dense window
+        # costs one request and none of its pages are fetched twice
+        params = dict(params)
+        params['from'] = window_start.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+        params['to'] = window_end.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+        splittable = window_end - window_start >= timedelta(seconds=2)
+        method = 'get'
+        endpoint = self.controller.endpoint(method, url, self.api_version)
+
+        def fetch(page):
+            result, r = self._make_request(method=method, url=url, params=dict(params, page=page))
+            if result['status'] != self.OK:
+                return result, None
+            batch = decode_json(r.content)
+            if key:
+                batch = batch[key]
+            record_page(self.core, endpoint, len(batch))
+            return result, batch
+
+        probe = None
+        if splittable:
+            result, probe = fetch(self.window_pages + 1)
+            if probe is None:
+                return result, [], False
+            if len(probe) == self.limit:
+                return result, [], True
+
+        items = []
+        page = 1
+        count = self.limit
+
+        while count == self.limit:
+            if probe is not None and page > self.window_pages:
+                # The probed page is the last one, it was not full
+                items.extend(probe)
+                break
+
+            result, batch = fetch(page)
+            if batch is None:
+                break
+            items.extend(batch)
+            count = len(batch)
+            page = page + 1
+
+        return result, items, False
+
+    def _iter_windows(self, url, params, start, end, key=None):
+
+        # Splits [start, end] into self.workers windows on the params'
+        # timestampField and fetches them concurrently instead of paging
+        # deep into one result set. A dense window is split in half before
+        # any of its pages are fetched, records seen in an earlier window
+        # are dropped by id. Yields (result, batch) per finished window.
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        step = (end - start) / self.workers
+        bounds = [start + step * i for i in range(self.workers)] + [end]
+        pending = {submit_in_context(executor, self._fetch_window, url, params, bounds[i], bounds[i + 1], key): (bounds[i], bounds[i + 1])
+                   for i in range(self.workers)}
+        seen = set()
+
+        try:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    window_start, window_end = pending.pop(future)
+                    result, items, dense = future.result()
+
+                    if result['status'] != self.OK:
+                        yield result, []
+                        return
+
+                    if dense:
+                        middle = window_start + timedelta(seconds=(window_end - window_start).total_seconds() // 2)
+                        for window in ((window_start, middle), (middle, window_end)):
+                            pending[submit_in_context(executor, self._fetch_window, url, params, *window, key)] = window
+
+                    batch = []
+                    for item in items:
+                        if item['id'] not in seen:
+                            seen.add(item['id'])
+                            batch.append(item)
+
+                    yield result, batch
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def _should_retry(self, method, r, error, data):
+
+        # 429 was not served whatever the method. Timeouts, dropped
+        # connections and 5xx are retried for idempotent GETs only: a
+        # repeated POST /system/restore or /assets/import is not something
+        # we want to do behind user's back. Connections that could not be
+        # established were retried by urllib3 already, see _make_session.
+        # A streamed body can only be sent again if it can be rewound.
+        if data is not None and not isinstance(data, (str, bytes, dict)) and not hasattr(data, 'rewind'):
+            return False
+        if r is not None:
+            return r.status_code == 429 or method == 'get' and r.status_code in (500, 502, 503, 504)
+        reason = getattr(error.args[0], 'reason', None) if error.args else None
+        if isinstance(error, requests.exceptions.ConnectTimeout) or isinstance(reason, NewConnectionError):
+            return False
+        return method == 'get'
+
+    def _make_request(self, method, url, params=None, data=None, stream=False, timeout=None):
+        
+        result = {
+                    "status": None,
+                    "details": None
+                  }
+        r = None
+        endpoint = self.controller.endpoint(method, url, self.api_version)
+        try:
+            # every attempt goes through the controller, see _should_retry
+            for attempt in range(self.retries + 1):
+                r = None
+                error = None
+                if attempt and hasattr(data, 'rewind'):
+                    data.rewind()
+                queued = monotonic()
+                started = self.controller.acquire(endpoint)
+                try:
+                    # verify per request: session.verify loses to REQUESTS_CA_BUNDLE/CURL_CA_BUNDLE
+                    r = self.session.request(method=method, url=url, params=params, data=data, timeout=timeout or self.timeout,
+                                             stream=stream, verify=self.verifiy)
+                except (requests.exceptions.ReadTimeout, requests.exceptions.ConnectionError) as e:
+                    error = e
+                except Exception as e:
+                    error = e
+                    raise
+                finally:
+                    self.controller.release(endpoint, started, r)
+                    record_request(self.core, endpoint, monotonic() - started, started - queued, r, error)
+
+                if attempt == self.retries or not self._should_retry(method, r, error, data):
+                    break
+                if r is not None:
+                    r.close()
+                metrics.inc('kuma_api_retries_total', (('core', self.core), ('endpoint', endpoint)))
+                timing = job_timing.get()
+                if timing is not None:
+                    timing.add(endpoint, retries=1)
+                # 429 and 503 hold the endpoint back in the controller for
+                # Retry-After, the rest backs off exponentially
+                if r is None or r.status_code not in (429, 503):
+                    sleep(self.backoff_factor * 2 ** attempt)
+
+            if error is not None:
+                raise error
+
+            if r.status_code == 200 or r.status_code == 204:
+                result['status'] = self.OK
+                result['details'] = ''
+            else:
+                result['status'] = self.ERROR
+                result['details'] = f"Status code: {r.status_code}. Details: {r.text}"
+        
+        except Exception as e:
+            result['status'] = self.ERROR
+            result['details'] = str(e)
+        
+        finally:
+            return result, r
+            
+            
+class KumaFleet:
+
+    # Several cores (e.g. one per region) queried in parallel. Exports of
+    # all cores are merged into one stream with the core name in front of
+    # every row, so an export takes as long as the slowest core. A core
+    # that fails does not stop the others, see _merge.
+    def __init__(self, cores, **options):
+
+        self.OK = 'OK'
+        self.ERROR = 'ERROR'
+        self.cores = cores
+        self.clients = {core['name']: Kuma(**options) for core in cores}
+        self.executor = ThreadPoolExecutor(max_workers=max(1, len(cores)), thread_name_prefix='core')
+
+    def close(self):
+        for kuma in self.clients.values():
+            kuma.close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def connect(self):
+
+        # Connects to every core concurrently and keeps only the cores that
+        # answered. Returns {core name: result}.
+        futures = {core['name']: submit_in_context(self.executor, self.clients[core['name']].connect,
+                                                        core['address'], str(core.get('port', '7223')), core['token'])
+                   for core in self.cores}
+        results = {name: future.result() for name, future in futures.items()}
+
+        for name, result in results.items():
+            if result['status'] != self.OK:
+                self.clients.pop(name).close()
+
+        return results
+
+    def _merge(self, pages_of, *args):
+
+        # pages_of(kuma, *args) is an iter_* generator of one core. Every
+        # core is read by its own thread into a bounded queue, so a fast
+        # core cannot run away with the memory. Yields (result, rows)
+        # with the core name as the first column of every row. The last
+        # item is (result, []) for the whole fleet: OK if at least one core
+        # was exported completely, its details name the failed cores and
+        # what the other cores reported as skipped.
+        pages = queue.Queue(maxsize=2 * max(1, len(self.clients)))
+        stop = threading.Event()
+        failed = []
+        partial = []
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce(name, kuma):
+            generator = pages_of(kuma, *args)
+            try:
+                for result, rows in generator:
+                    if result['status'] != kuma.OK:
+                        failed.append(f"{name}: {result['details']}")
+                        break
+                    if result['details']:
+                        partial.append(f"{name}: {result['details']}")
+                    if not put((name, rows)):
+                        break
+            except Exception as e:
+                failed.append(f"{name}: {e}")
+            finally:
+                generator.close()
+                put(None)
+
+        for name, kuma in self.clients.items():
+            submit_in_context(self.executor, produce, name, kuma)
+
+        running = len(self.clients)
+        try:
+            while running:
+                item = pages.get()
+                if item is None:
+                    running = running - 1
+                    continue
+                name, rows = item
+                yield {"status": self.OK, "details": ''}, [[name] + list(row) for row in rows]
+        finally:
+            stop.set()
+
+        status = self.OK if len(failed) < len(self.clients) else self.ERROR
+        yield {"status": status, "details": '; '.join(sorted(failed) + sorted(partial))}, []
+
+    def _gather(self, get_list, *args):
+
+        # Same as _merge for get_* methods returning (result, list)
+        def pages_of(kuma, *args):
+            yield get_list(kuma, *args)
+
+        rows = []
+        for result, batch in self._merge(pages_of, *args):
+            rows.extend(batch)
+        return result, rows
+
+    def iter_alerts(self, status=None, time_field=None, start=None, end=None, sharded=False, columns=None):
+        return self._merge(Kuma.iter_alerts, status, time_field, start, end, sharded, columns)
+
+    def iter_incidents(self, status=None, time_field=None, start=None, end=None, sharded=False, columns=None):
+        return self._merge(Kuma.iter_incidents, status, time_field, start, end, sharded, columns)
+
+    def identities(self):
+        # of the connected cores, for artifact keys
+        return sorted(kuma.identity for kuma in self.clients.values())
+
+    def get_tenants(self):
+        return self._gather(Kuma.get_tenants)
+
+    def get_rules_from_all_correlators(self):
+        return self._gather(Kuma.get_rules_from_all_correlators)
+
+
+def load_cores(path):
+
+    # JSON list of {"name", "address", "port", "token"}; instead of the
+    # token itself "token_env" may name the environment variable with it
+    with open(path, encoding='utf8') as f:
+        cores = json.load(f)
+
+    for core in cores:
+        if 'token_env' in core:
+            core['token'] = os.environ.get(core['token_env'], '')
+        missing = [field for field in ('name', 'address', 'token') if not core.get(field)]
+        if missing:
+            raise ValueError(f"Core {core.get('name') or core.get('address')}: {', '.join(missing)} not set")
+
+    names = [core['name'] for core in cores]
+    if len(set(names)) != len(names):
+        raise ValueError("Core names must be unique")
+
+    return cores
+
+
+def new_kuma():
+    return Kuma(pool_size=POOL_SIZE, workers=WORKERS, cache_ttl=CACHE_TTL, index_refresh=INDEX_REFRESH)
+
+
+def parse_columns(spec, default):
+
+    # Export columns from "name,id,host=sourceAddress,..." where an item is
+    # a column of default, a dotted path in the API object or column=path.
+    # An empty spec means default.
+    if not spec or not spec.strip():
+        return default
+
+    known = dict(default)
+    columns = []
+    for item in spec.split(','):
+        if not item.strip():
+            continue
+        column, _, path = (part.strip() for part in item.partition('='))
+        path = path or known.get(column, column)
+        if not column or not path or path.startswith('.') or path.endswith('.'):
+            raise ValueError(f"Invalid column {item.strip()!r}")
+        columns.append((column, path))
+
+    names = [column for column, _ in columns]
+    if len(set(names)) != len(names):
+        raise ValueError("Column names must be unique")
+    return columns
+
+
+def column_getter(path):
+
+    # Function returning the value at a dotted path of an API object or
+    # None if it is missing, built once per export instead of per row
+    if '.' not in path:
+        return lambda record: record.get(path)
+
+    keys = path.split('.')
+
+    def get(record):
+        for key in keys:
+            if not isinstance(record, dict):
+                return None
+            record = record.get(key)
+        return record
+    return get
+
+
+def flat_value(value):
+    # Text columns (CSV, Parquet) take nested values as JSON
+    return value if value is None or isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+
+
+def open_text(path, compression=None, level=None):
+
+    # Text file for writing, compressed on the fly by 'gzip' or 'zstd'
+    if compression == 'gzip':
+        return gzip.open(path, 'wt', compresslevel=level or 6, newline='', encoding='utf8')
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ImportError("zstd compression needs the zstandard package")
+        stream = zstandard.ZstdCompressor(level=level or 3).stream_writer(open(path, 'wb'))
+        return io.TextIOWrapper(stream, newline='', encoding='utf8')
+    return open(path, 'w', newline='', encoding='utf8')
+
+
+class ExportWriter:
+
+    # Writes rows page by page as they arrive from an iter_* generator, so
+    # only the pages in flight are kept in memory:
+    #
+    #   with open_writer(fmt, path, header) as writer:
+    #       writer.write(rows)
+    def __init__(self, path, header, compression=None):
+        self.path = path
+        self.header = list(header)
+        self.compression = compression
+
+    def write(self, rows):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CsvWriter(ExportWriter):
+
+    def __init__(self, path, header, compression=None):
+        super().__init__(path, header, compression)
+        self.file = open_text(path, compression)
+        self.writer = csv.writer(self.file, delimiter=',')
+        self.writer.writerow(self.header)
+
+    def write(self, rows):
+        self.writer.writerows([flat_value(value) for value in row] for row in rows)
+
+    def close(self):
+        self.file.close()
+
+
+class NdjsonWriter(ExportWriter):
+
+    # One JSON object per line, nested values stay JSON
+    def __init__(self, path, header, compression=None):
+        super().__init__(path, header, compression)
+        self.file = open_text(path, compression)
+
+    def write(self, rows):
+        header = self.header
+        self.file.writelines(encode_json(dict(zip(header, row))) + '\n' for row in rows)
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter(ExportWriter):
+
+    # All columns are strings. Rows are buffered up to row_group_size and
+    # written as one row group, so memory is bounded by a row group and
+    # readers can skip groups.
+    def __init__(self, path, header, compression='zstd', row_group_size=50000):
+        if pyarrow is None:
+            raise ImportError("Parquet export needs the pyarrow package")
+        super().__init__(path, header, compression)
+        self.row_group_size = row_group_size
+        self.schema = pyarrow.schema([(column, pyarrow.string()) for column in self.header])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema, compression=compression)
+        self.rows = []
+
+    def write(self, rows):
+        self.rows.extend(rows)
+        while len(self.rows) >= self.row_group_size:
+            self.flush(self.rows[:self.row_group_size])
+            del self.rows[:self.row_group_size]
+
+    def flush(self, rows):
+        columns = [pyarrow.array([flat_value(row[i]) for row in rows], pyarrow.string()) for i in range(len(self.header))]
+        self.writer.write_table(pyarrow.Table.from_arrays(columns, schema=self.schema))
+
+    def close(self):
+        if self.rows:
+            self.flush(self.rows)
+            self.rows = []
+        self.writer.close()
+
+
+# format: (writer, compression, file extension)
+EXPORT_FORMATS = {
+    'csv': (CsvWriter, None, '.csv'),
+    'csv.gz': (CsvWriter, 'gzip', '.csv.gz'),
+    'csv.zst': (CsvWriter, 'zstd', '.csv.zst'),
+    'ndjson': (NdjsonWriter, None, '.ndjson'),
+    'ndjson.gz': (NdjsonWriter, 'gzip', '.ndjson.gz'),
+    'parquet': (ParquetWriter, 'zstd', '.parquet')
+}
+
+
+def available_formats():
+    # Formats whose optional packages are installed
+    return [fmt for fmt in EXPORT_FORMATS
+            if not (fmt.endswith('.zst') and zstandard is None) and not (fmt == 'parquet' and pyarrow is None)]
+
+
+def open_writer(fmt, path, header):
+    writer, compression, _ = EXPORT_FORMATS[fmt]
+    return writer(path, header, compression)
+
+
+def write_export(path, fmt, header, pages, callback=None):
+
+    # Writes the pages of an iter_* generator in fmt, callback(written) is
+    # called after every page. Returns the last page's result.
+    written = 0
+    with open_writer(fmt, path, header) as writer:
+        for result, rows in pages:
+            writer.write(rows)
+            written = written + len(rows)
+            if callback:
+                callback(written)
+
+    return result
+
+
+def new_temp_path(prefix=None, suffix=None):
+    temp_file = tempfile.NamedTemporaryFile(delete=False, prefix=prefix, suffix=suffix)
+    temp_file.close()
+    return temp_file.name
+
+
+def parse_time(value):
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def write_delta(kuma, kind, status, path, fmt='csv', columns=None, callback=None):
+
+    # Incremental export of 'alerts' or 'incidents': only records whose
+    # lastSeen/updatedAt is newer than the watermark of their tenant are
+    # written. The query starts at the oldest watermark of the current
+    # tenants, a tenant without one (first run, new tenant) means a full
+    # export. A tenant without records gets a watermark too, otherwise it
+    # would mean a full export on every run; it is taken from the core's
+    # clock, never the local one. Watermarks move forward only after the
+    # whole file has been written. Returns (result, rows_written).
+    if kind == 'alerts':
+        time_field, default, pages = 'lastSeen', ALERTS_COLUMNS, kuma.iter_alerts
+    else:
+        time_field, default, pages = 'updatedAt', INCIDENTS_COLUMNS, kuma.iter_incidents
+    columns = columns or default
+
+    scope = f"{kuma.address}:{kuma.port}/{kind}/{','.join(sorted(status or []))}"
+    watermarks = {tenant: parse_time(mark) for tenant, mark in watermark_store.get(scope).items()}
+    new_watermarks = {}
+    written = 0
+    # Date has whole seconds, a second back keeps records of that second
+    started = kuma.get_core_time()
+    if started is not None:
+        started = started - timedelta(seconds=1)
+
+    # a tenant created since the cache was filled must not be missed
+    kuma.cache.invalidate('tenants')
+    result, tenants = kuma.get_tenants()
+    if result['status'] != kuma.OK:
+        return result, written
+
+    start = None
+    if tenants and all(tenant_id in watermarks for _, tenant_id in tenants):
+        start = min(watermarks[tenant_id] for _, tenant_id in tenants)
+
+    def delta(pages):
+        nonlocal written
+        for result, rows in pages:
+            fresh = []
+            # the watched timestamp and tenantID are fetched as two extra
+            # columns after the selected ones and are not written
+            for row in rows:
+                mark, tenant = row[-2], row[-1]
+                timestamp = parse_time(mark)
+                if tenant not in watermarks or timestamp > watermarks[tenant]:
+                    fresh.append(row[:-2])
+                if tenant not in new_watermarks or timestamp > new_watermarks[tenant][0]:
+                    new_watermarks[tenant] = (timestamp, mark)
+            written = written + len(fresh)
+            yield result, fresh
+
+    pages = pages(status, time_field if start else None, start, None, columns=columns + [('', time_field), ('', 'tenantID')])
+    result = write_export(path, fmt, [column for column, _ in columns], delta(pages), callback)
+
+    if result['status'] == kuma.OK:
+        # for tenants without records: the newest record of the run or, if
+        # there was none, the core's time the run started at. Without
+        # either they stay without a watermark.
+        empty = max(new_watermarks.values())[1] if new_watermarks else None
+        if empty is None and started is not None:
+            empty = started.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+        for _, tenant_id in tenants:
+            if empty and tenant_id not in watermarks and tenant_id not in new_watermarks:
+                new_watermarks[tenant_id] = (None, empty)
+        watermark_store.update(scope, {tenant: mark for tenant, (_, mark) in new_watermarks.items()})
+
+    return result, written
+
+
+def run_export(job, kuma, kind, status, time_field, start, end, sharded, incremental, fmt='csv', columns=None):
+
+    # Job: export of 'alerts' or 'incidents' in one of EXPORT_FORMATS,
+    # columns as returned by parse_columns, None for the default ones
+    callback = lambda written: job.report(written, desc=f"Exporting {kind}", unit="rows")
+    extension = EXPORT_FORMATS[fmt][2]
+
+    # an incremental export moves the watermarks, it is never reused
+    if incremental:
+        job.path = job.new_path(f"{kind}_delta_{kuma.core}", extension)
+        result, written = write_delta(kuma, kind, status, job.path, fmt, columns, callback)
+        job.details = f"{written} new or updated {kind} since the last incremental export"
+        return result
+
+    columns = columns or (ALERTS_COLUMNS if kind == 'alerts' else INCIDENTS_COLUMNS)
+    if job.reuse(kind, kuma.identity, status, time_field, start, end, sharded, fmt, columns):
+        return {"status": kuma.OK, "details": ''}
+
+    pages = (kuma.iter_alerts if kind == 'alerts' else kuma.iter_incidents)(status, time_field, start, end, sharded, columns)
+    job.path = job.new_path(f"{kind}_{kuma.core}", extension)
+    return write_export(job.path, fmt, [column for column, _ in columns], pages, callback)
+
+
+def run_fleet_export(job, fleet, kind, status, time_field, start, end, sharded, fmt='csv', columns=None):
+
+    # Job: export of 'alerts' or 'incidents' of every core of a KumaFleet,
+    # with the core name in the first column
+    callback = lambda written: job.report(written, desc=f"Exporting {kind} from {len(fleet.clients)} cores", unit="rows")
+    columns = columns or (ALERTS_COLUMNS if kind == 'alerts' else INCIDENTS_COLUMNS)
+    header = ['core'] + [column for column, _ in columns]
+    if job.reuse(kind, fleet.identities(), status, time_field, start, end, sharded, fmt, columns):
+        return {"status": fleet.OK, "details": ''}
+
+    pages = (fleet.iter_alerts if kind == 'alerts' else fleet.iter_incidents)(status, time_field, start, end, sharded, columns)
+    job.path = job.new_path(f"{kind}_fleet", EXPORT_FORMATS[fmt][2])
+    result = write_export(job.path, fmt, header, pages, callback)
+    if result['status'] == fleet.OK and result['details']:
+        job.details = f"Some cores were not exported: {result['details']}"
+        job.warning = True
+
+    return result
+
+
+def run_fleet_rules_export(job, fleet, fmt='csv'):
+
+    # Job: rules of all correlators of every core of a KumaFleet
+    job.report(0, desc="Exporting rules")
+    if job.reuse('rules', fleet.identities(), 'All correlators', fmt):
+        return {"status": fleet.OK, "details": ''}
+    result, rules = fleet.get_rules_from_all_correlators()
+
+    if result['status'] == fleet.OK:
+        job.path = job.new_path("rules_fleet", EXPORT_FORMATS[fmt][2])
+        write_rules(job.path, rules, ('core', 'name', 'kind', 'id', 'correlator'), fmt)
+        if result['details']:
+            job.details = f"Some cores or correlators were not exported: {result['details']}"
+            job.warning = True
+
+    return result
+
+
+def run_rules_export(job, kuma, choice, correlator_id, tenant_id, fmt='csv'):
+
+    # Job: export of correlation rules in one of EXPORT_FORMATS
+    job.report(0, desc="Exporting rules")
+    header = ('name', 'kind', 'id')
+    if job.reuse('rules', kuma.identity, choice, correlator_id, tenant_id, fmt):
+        return {"status": kuma.OK, "details": ''}
+
+    if choice == 'By tenant':
+        result, rules = kuma.get_rules_from_tenant(tenant_id)
+    elif choice == 'All correlators':
+        result, rules = kuma.get_rules_from_all_correlators()
+        header = ('name', 'kind', 'id', 'correlator')
+    else:
+        result, rules = kuma.get_rules_from_correlator(correlator_id)
+
+    if result['status'] == kuma.OK:
+        job.path = job.new_path(f"rules_{kuma.core}", EXPORT_FORMATS[fmt][2])
+        write_rules(job.path, rules, header, fmt)
+        if result['details']:
+            job.details = f"Some correlators were not exported: {result['details']}"
+            job.warning = True
+
+    return result
+
+
+def write_rules(path, rules, header=('name', 'kind', 'id'), fmt='csv'):
+    with open_writer(fmt, path, header) as writer:
+        writer.write(rules)
+
+
+def run_backup(job, kuma):
+
+    # Job: download of /system/backup
+    # a backup is taken before risky changes, it is never reused
+    job.report(0, desc="Waiting for the core to create backup")
+    job.path = job.new_path(f"backup_{kuma.core}", ".tar.gz")
+    return kuma.backup(job.path, callback=lambda written, total: job.report(written, total, "Downloading backup", "bytes"))
+
+
+def run_restore(job, kuma, path):
+
+    # Job: upload of a backup archive to /system/restore
+    result = kuma.restore(path, callback=lambda sent, total: job.report(sent, total, "Uploading backup", "bytes"))
+    job.details = "Backup successfuly scheduled"
+    # results taken before the restore must not be served after it
+    if job.store is not None:
+        job.store.invalidate()
+    return result
+    
+    
+def dump_resources(kuma, path, fmt='ndjson', kinds=RESOURCE_KINDS, callback=None):
+
+    # Writes the full body of every resource either as gzip NDJSON, one
+    # resource per line, or as a tar.gz with a kind/id.json member per
+    # resource. Bodies are written as they arrive from
+    # Kuma.iter_resource_bodies. Resources and kinds that could not be
+    # fetched are returned as (kind, id, name, details) and, in tar.gz,
+    # listed in errors.json. callback(dumped) is called per resource.
+    # Returns (dumped, failed).
+    dumped = 0
+    failed = []
+
+    if fmt == 'tar':
+        archive = tarfile.open(path, 'w:gz')
+    else:
+        archive = gzip.open(path, 'wt', encoding='utf8')
+
+    with archive:
+        for result, meta, resource in kuma.iter_resource_bodies(kinds):
+            if result['status'] != kuma.OK:
+                failed.append((meta['kind'], meta.get('id'), meta.get('name'), result['details']))
+                continue
+
+            if fmt == 'tar':
+                add_to_tar(archive, f"{meta['kind']}/{meta['id']}.json", json.dumps(resource, ensure_ascii=False, indent=2))
+            else:
+                archive.write(json.dumps(resource, ensure_ascii=False) + '\n')
+
+            dumped = dumped + 1
+            if callback:
+                callback(dumped)
+
+        if fmt == 'tar' and failed:
+            errors = [dict(zip(('kind', 'id', 'name', 'details'), error)) for error in failed]
+            add_to_tar(archive, 'errors.json', json.dumps(errors, ensure_ascii=False, indent=2))
+
+    return dumped, failed
+
+
+def add_to_tar(archive, name, text):
+    data = text.encode('utf8')
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = int(time())
+    archive.addfile(info, io.BytesIO(data))
+
+
+def run_resources_dump(job, kuma, fmt):
+
+    # Job: archive of every resource, fmt is 'ndjson' or 'tar'
+    # the current configuration, like a backup, it is never reused
+    job.report(0, desc="Listing resources")
+    job.path = job.new_path(f"resources_{kuma.core}", ".tar.gz" if fmt == 'tar' else ".ndjson.gz")
+    dumped, failed = dump_resources(kuma, job.path, fmt,
+                                    callback=lambda dumped: job.report(dumped, desc="Dumping resources", unit="resources"))
+
+    job.details = f"{dumped} resources dumped"
+    if failed:
+        kinds = sorted({kind for kind, *_ in failed})
+        job.details = job.details + f", {len(failed)} could not be fetched ({', '.join(kinds)})"
+        job.warning = True
+
+    return {"status": kuma.OK, "details": ''}
+
+
+def take_snapshot(kuma, store, callback=None):
+
+    # Snapshots every resource of the core. A resource whose updatedAt is
+    # the same as in the core's previous snapshot is not downloaded again,
+    # it keeps its hash. A resource that could not be fetched, and every
+    # resource of a kind that could not be listed, keeps its entry of the
+    # previous snapshot, so a failed request does not show up as 'removed'
+    # in diff_snapshots. Returns (snapshot, manifest).
+    core = store.core_name(kuma.address, kuma.port)
+    previous = store.load_index(store.latest(core))
+    entries = []
+    failed = []
+    failed_kinds = set()
+    fetched = 0
+    carried = 0
+
+    def unchanged(meta):
+        return meta.get('updatedAt') is not None and previous.get(meta['id'], {}).get('updatedAt') == meta['updatedAt']
+
+    for result, meta, resource in kuma.iter_resource_bodies(skip=unchanged):
+        if result['status'] != kuma.OK:
+            failed.append({'kind': meta['kind'], 'id': meta.get('id'), 'name': meta.get('name'), 'details': result['details']})
+            if 'id' not in meta:
+                failed_kinds.add(meta['kind'])
+            elif meta['id'] in previous:
+                entries.append(previous[meta['id']])
+                carried = carried + 1
+            continue
+
+        if resource is None:
+            digest = previous[meta['id']]['hash']
+        else:
+            digest = store.write_object(resource)
+            fetched = fetched + 1
+
+        entries.append({
+            'id': meta['id'],
+            'kind': meta['kind'],
+            'name': meta['name'],
+            'tenantName': meta['tenantName'],
+            'updatedAt': meta.get('updatedAt'),
+            'hash': digest
+        })
+        if callback:
+            callback(len(entries))
+
+    if failed_kinds:
+        # the kind may have been listed in part before the failure
+        listed = {entry['id'] for entry in entries}
+        for entry in previous.values():
+            if entry['kind'] in failed_kinds and entry['id'] not in listed:
+                entries.append(entry)
+                carried = carried + 1
+
+    manifest = {
+        'core': f"{kuma.address}:{kuma.port}",
+        'identity': kuma.identity,
+        'created': strftime('%Y-%m-%dT%H:%M:%S'),
+        'resources': len(entries),
+        'fetched': fetched,
+        'unchanged': len(entries) - fetched - carried,
+        'carried': carried,
+        'failed': failed
+    }
+
+    return store.write_snapshot(core, entries, manifest), manifest
+
+
+def diff_snapshots(snapshot_a, snapshot_b, by='id'):
+
+    # Streaming merge of two snapshot indexes sorted by the same key, only
+    # one line of each is in memory. by='id' compares snapshots of one
+    # core, by='name' matches resources by kind, tenant and name and so
+    # works across cores. Yields (change, entry_a, entry_b) with change
+    # being 'added', 'removed' or 'changed'.
+    name, key = ('by_id.ndjson', snapshot_key_id) if by == 'id' else ('by_name.ndjson', snapshot_key_name)
+
+    with open(Path(snapshot_a) / name, encoding='utf8') as file_a, open(Path(snapshot_b) / name, encoding='utf8') as file_b:
+        lines_a = map(decode_json, file_a)
+        lines_b = map(decode_json, file_b)
+        entry_a = next(lines_a, None)
+        entry_b = next(lines_b, None)
+
+        while entry_a is not None or entry_b is not None:
+            if entry_b is None or (entry_a is not None and key(entry_a) < key(entry_b)):
+                yield 'removed', entry_a, None
+                entry_a = next(lines_a, None)
+            elif entry_a is None or key(entry_b) < key(entry_a):
+                yield 'added', None, entry_b
+                entry_b = next(lines_b, None)
+            else:
+                if entry_a['hash'] != entry_b['hash']:
+                    yield 'changed', entry_a, entry_b
+                entry_a = next(lines_a, None)
+                entry_b = next(lines_b, None)
+
+
+def write_snapshots_diff(path, snapshot_a, snapshot_b, by='id'):
+
+    # diff_snapshots as CSV, returns the number of changes of every kind
+    counts = {'added': 0, 'removed': 0, 'changed': 0}
+
+    with open(path, 'w', newline='', encoding='utf8') as csvfile:
+        writer = csv.writer(csvfile, delimiter=',')
+        writer.writerow(['change', 'kind', 'tenantName', 'name', 'id_a', 'id_b', 'hash_a', 'hash_b'])
+
+        for change, entry_a, entry_b in diff_snapshots(snapshot_a, snapshot_b, by):
+            counts[change] = counts[change] + 1
+            entry = entry_a or entry_b
+            writer.writerow([change, entry['kind'], entry['tenantName'], entry['name'],
+                             (entry_a or {}).get('id'), (entry_b or {}).get('id'),
+                             (entry_a or {}).get('hash'), (entry_b or {}).get('hash')])
+
+    return counts
+
+
+def run_snapshot(job, kuma, store):
+
+    # Job: configuration snapshot of every resource
+    job.report(0, desc="Listing resources")
+    snapshot, manifest = take_snapshot(kuma, store,
+                                       callback=lambda done: job.report(done, desc="Snapshotting resources", unit="resources"))
+
+    job.details = (f"Snapshot {snapshot.parent.name}/{snapshot.name}: {manifest['resources']} resources, "
+                   f"{manifest['fetched']} downloaded, {manifest['unchanged']} unchanged")
+    if manifest['failed']:
+        job.details = job.details + (f", {len(manifest['failed'])} resources or kinds could not be fetched, "
+                                     f"{manifest['carried']} resources kept from the previous snapshot")
+        job.warning = True
+
+    return {"status": kuma.OK, "details": ''}
+
+
+def json_child_path(path, key):
+    if isinstance(key, int):
+        return f"{path}[{key}]"
+    if re.fullmatch(r'[A-Za-z_][A-Za-z0-9_]*', key):
+        return f"{path}.{key}"
+    return f"{path}['{key}']"
+
+
+def json_children(path, value):
+    if isinstance(value, dict):
+        return [(json_child_path(path, k), v) for k, v in value.items()]
+    if isinstance(value, list):
+        return [(json_child_path(path, i), v) for i, v in enumerate(value)]
+    return []
+
+
+def json_descendants(path, value):
+    yield path, value
+    for child_path, child in json_children(path, value):
+        yield from json_descendants(child_path, child)
+
+
+def json_query(document, expression):
+
+    # Evaluates a JSONPath subset on the server: $, .key, ['key'], [n],
+    # [*], .* and ..key (key search at any depth).
+    # Returns a list of (path, value) matches.
+    expression = (expression or '$').strip()
+    if expression.startswith('$'):
+        expression = expression[1:]
+
+    nodes = [('$', document)]
+    position = 0
+
+    while position < len(expression):
+        token = JSONPATH_TOKEN_RE.match(expression, position)
+        if not token:
+            raise ValueError(f"Invalid JSONPath near '{expression[position:]}'")
+        position = token.end()
+
+        key = token['key'] if token['key'] is not None else token['quoted']
+        matches = []
+
+        for path, value in nodes:
+            if token['deep'] is not None:
+                for deep_path, deep_value in json_descendants(path, value):
+                    if token['deep'] == '*':
+                        matches.extend(json_children(deep_path, deep_value))
+                    elif isinstance(deep_value, dict) and token['deep'] in deep_value:
+                        matches.append((json_child_path(deep_path, token['deep']), deep_value[token['deep']]))
+            elif token['star'] or key == '*':
+                matches.extend(json_children(path, value))
+            elif key is not None:
+                if isinstance(value, dict) and key in value:
+                    matches.append((json_child_path(path, key), value[key]))
+            elif isinstance(value, list):
+                index = int(token['index'])
+                if -len(value) <= index < len(value):
+                    matches.append((json_child_path(path, index % len(value)), value[index]))
+
+        nodes = matches
+
+    return nodes
+
+
+def json_preview(value, depth, page_size=100):
+
+    # Copy of value cut after depth levels: deeper containers are replaced
+    # by a short summary and containers are cut to page_size entries
+    if isinstance(value, dict):
+        if depth <= 0:
+            return f"{{...}} {len(value)} keys"
+        preview = {k: json_preview(v, depth - 1, page_size) for k, v in islice(value.items(), page_size)}
+        if len(value) > page_size:
+            preview['...'] = f"{len(value) - page_size} more keys"
+        return preview
+
+    if isinstance(value, list):
+        if depth <= 0:
+            return f"[...] {len(value)} items"
+        preview = [json_preview(v, depth - 1, page_size) for v in value[:page_size]]
+        if len(value) > page_size:
+            preview.append(f"... {len(value) - page_size} more items")
+        return preview
+
+    return value
+
+
+def asset_from_row(row):
+    return {
+        "name": row['name'],
+        "fqdn": row['fqdn'].split(';') if len(row['fqdn']) > 0 else [],
+        "ipAddresses": row['ipAddresses'].split(';') if len(row['ipAddresses']) > 0 else [],
+        "macAddresses": row['macAddresses'].split(';') if len(row['macAddresses']) > 0 else [],
+        "os": {
+            "name": row['osName'],
+            "version": int(row['osVersion'])
+        }
+
+    }
+
+
+def validate_asset_row(row):
+
+    # Returns (field, value, reason) for every problem of one CSV row,
+    # the checks mirror what KUMA rejects on import
+    errors = []
+    values = {field: row.get(field) or '' for field in ASSETS_HEADER}
+    fqdns = values['fqdn'].split(';') if values['fqdn'] else []
+    ips = values['ipAddresses'].split(';') if values['ipAddresses'] else []
+    macs = values['macAddresses'].split(';') if values['macAddresses'] else []
+
+    if not values['name']:
+        errors.append(('name', '', 'name is required'))
+
+    if not fqdns and not ips:
+        errors.append(('fqdn', '', 'either fqdn or ipAddresses is required'))
+
+    for fqdn in fqdns:
+        if not FQDN_RE.fullmatch(fqdn):
+            errors.append(('fqdn', fqdn, 'invalid FQDN'))
+
+    for ip in ips:
+        # the regex settles plain IPv4 without the cost of ipaddress objects
+        if IPV4_RE.fullmatch(ip):
+            continue
+        try:
+            ipaddress.ip_address(ip)
+        except ValueError:
+            errors.append(('ipAddresses', ip, 'invalid IPv4/IPv6 address'))
+
+    for mac in macs:
+        if not MAC_RE.fullmatch(mac):
+            errors.append(('macAddresses', mac, 'invalid MAC address'))
+
+    try:
+        int(values['osVersion'])
+    except ValueError:
+        errors.append(('osVersion', values['osVersion'], 'osVersion must be an integer'))
+
+    return errors
+
+
+def validate_assets_csv(path):
+
+    # Streams through the CSV once and returns (line, field, value, reason)
+    # for every problem found, an empty list means the file can be imported
+    errors = []
+
+    with open(path, newline='') as csvfile:
+        reader = csv.DictReader(csvfile)
+        missing = [field for field in ASSETS_HEADER if field not in (reader.fieldnames or [])]
+        if missing:
+            return [(1, ','.join(missing), '', 'missing columns in header')]
+
+        for row in reader:
+            for field, value, reason in validate_asset_row(row):
+                errors.append((reader.line_num, field, value, reason))
+
+    return errors
+
+
+def read_assets_csv(path):
+
+    # Returns the assets of a validated CSV and the CSV line of every
+    # asset for the import report
+    assets = []
+    lines = []
+    with open(path, newline='') as csvfile:
+        reader = csv.DictReader(csvfile)
+        for row in reader:
+            lines.append(reader.line_num)
+            assets.append(asset_from_row(row))
+
+    return assets, lines
+
+
+def run_assets_import(job, kuma, assets, lines, tenant_id, batch_size):
+
+    # Job: batched asset import. Leaves the per-batch report as a Markdown
+    # table in job.output and the rejected assets in job.path
+    report = kuma.import_assets_batched(assets, tenant_id, batch_size=batch_size or len(assets) or 1,
+                                        callback=lambda done, total: job.report(done, total, "Importing batches", "batches"))
+
+    summary = ["| Batch | CSV lines | Assets | Imported | Rejected |", "|---|---|---|---|---|"]
+    rejected = []
+    for number, batch in enumerate(report, start=1):
+        first_line, last_line = lines[batch['first']], lines[batch['first'] + batch['size'] - 1]
+        summary.append(f"| {number} | {first_line}-{last_line} | {batch['size']} | {batch['imported']} | {len(batch['rejected'])} |")
+        for index, name, details in batch['rejected']:
+            rejected.append([number, lines[index], name, details])
+
+    job.output = "\n".join(summary)
+
+    if rejected:
+        job.path = job.new_path(f"rejected_assets_{kuma.core}", ".csv")
+        with open(job.path, 'w', newline='', encoding='utf8') as csvfile:
+            writer = csv.writer(csvfile, delimiter=',')
+            writer.writerow(['batch', 'line', 'name', 'details'])
+            writer.writerows(rejected)
+        job.details = f"{len(assets) - len(rejected)} of {len(assets)} assets have been imported, {len(rejected)} rejected"
+        job.warning = True
+    else:
+        job.details = f"All {len(assets)} assets have been imported"
+
+    return {"status": kuma.OK, "details": ''}
+
+
+watermark_store = WatermarkStore(DATA_DIR / 'watermarks.json')
+snapshot_store = SnapshotStore(DATA_DIR / 'snapshots')
+artifact_store = ArtifactStore(DATA_DIR / 'artifacts', ARTIFACTS_QUOTA, ARTIFACT_MAX_AGE)
@@ -0,0 +1,346 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from itertools import islice
+from datetime import datetime, timedelta, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+
+# Local stand-in for the parts of the KUMA /api/v3 the client uses, for
+# benchmarks and experiments without a real core:
+#
+#   python mock_kuma.py --port 7223 --alerts 100000 --latency 20 --error-rate 0.01
+#   Kuma(scheme='http').connect('127.0.0.1', '7223', 'any token')
+#
+# Records are generated from their index on every request, so any volume
+# costs no memory. Alert/incident i belongs to tenant i % tenants, has
+# status number i % len(statuses) and its timestamps grow by one second
+# per record from BASE_TIME. GET /_stats returns request counts per path.
+
+BASE_TIME = datetime(2024, 1, 1, tzinfo=timezone.utc)
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%S.000Z'
+
+ALERT_STATUSES = ["new", "assigned", "closed", "escalated"]
+INCIDENT_STATUSES = ["open", "assigned", "closed"]
+RESOURCE_KINDS = ["collector", "correlator", "storage", "activeList", "aggregationRule", "connector",
+                  "correlationRule", "dictionary", "enrichmentRule", "destination", "filter", "normalizer",
+                  "responseRule", "search", "agent", "proxy", "secret", "contextTable", "emailTemplate",
+                  "segmentationRule", "eventRouter"]
+
+
+def make_id(kind, index):
+    # stable UUIDs, kind keeps ids of different record types apart
+    return str(uuid.UUID(int=(kind << 64) + index))
+
+
+def timestamp(index, shift=0):
+    return (BASE_TIME + timedelta(seconds=index + shift)).strftime(TIME_FORMAT)
+
+
+def parse_timestamp(value):
+    return datetime.strptime(value, TIME_FORMAT).replace(tzinfo=timezone.utc)
+
+
+class MockData:
+
+    def __init__(self, alerts=10000, incidents=10000, tenants=5, resources=50, correlators=10, rules=50,
+                 resource_kb=4, backup_mb=16, page_size=250):
+
+        self.alerts = alerts
+        self.incidents = incidents
+        self.tenants = tenants
+        self.resources = resources
+        self.correlators = correlators
+        self.rules = rules
+        self.resource_kb = resource_kb
+        self.backup_mb = backup_mb
+        self.page_size = page_size
+
+    def tenant(self, index):
+        number = index % self.tenants
+        return f"Tenant {number}", make_id(1, number)
+
+    def matching(self, total, statuses, allowed, time_range, page):
+
+        # Indexes of the page-th page of records that have an allowed
+        # status and a timestamp in time_range, computed without walking
+        # through the records before the page
+        first, last = 0, total
+        if time_range:
+            start, end = time_range
+            if start:
+                first = max(first, int((parse_timestamp(start) - BASE_TIME).total_seconds()))
+            if end:
+                last = min(last, int((parse_timestamp(end) - BASE_TIME).total_seconds()) + 1)
+
+        residues = sorted(statuses.index(status) for status in (allowed or statuses) if status in statuses)
+        if not residues or first >= last:
+            return []
+
+        cycle = len(statuses)
+        block = first - first % cycle
+        # matches in [block, first) are not part of the result
+        skipped = sum(1 for residue in residues if block + residue < first)
+
+        indexes = []
+        number = (page - 1) * self.page_size + skipped
+        while len(indexes) < self.page_size:
+            index = block + (number // len(residues)) * cycle + residues[number % len(residues)]
+            if index >= last:
+                break
+            indexes.append(index)
+            number = number + 1
+        return indexes
+
+    def alert(self, index):
+        tenant_name, tenant_id = self.tenant(index)
+        return {
+            "id": make_id(2, index),
+            "name": f"Alert {index}",
+            "status": ALERT_STATUSES[index % len(ALERT_STATUSES)],
+            "firstSeen": timestamp(index),
+            "lastSeen": timestamp(index),
+            "assignee": "",
+            "tenantID": tenant_id,
+            "tenantName": tenant_name,
+            "severity": "medium",
+            "correlationRuleName": f"Rule {index % 100}"
+        }
+
+    def incident(self, index):
+        tenant_name, tenant_id = self.tenant(index)
+        return {
+            "id": make_id(3, index),
+            "name": f"Incident {index}",
+            "status": INCIDENT_STATUSES[index % len(INCIDENT_STATUSES)],
+            "createdAt": timestamp(index),
+            "updatedAt": timestamp(index),
+            "assigneeName": "",
+            "tenantID": tenant_id,
+            "tenantName": tenant_name,
+            "priority": "low"
+        }
+
+    def resource(self, kind, index):
+        tenant_name, tenant_id = self.tenant(index)
+        return {
+            "id": make_id(10 + RESOURCE_KINDS.index(kind), index),
+            "kind": kind,
+            "name": f"{kind} {index}",
+            "tenantID": tenant_id,
+            "tenantName": tenant_name,
+            "updatedAt": timestamp(index)
+        }
+
+    def resource_list(self, kind, name, tenant_id, page):
+        # resources of every kind, filtered like the core does
+        pattern = re.compile(name) if name else None
+        matches = ((k, i) for k in ([kind] if kind else RESOURCE_KINDS) for i in range(self.resources)
+                   if (not pattern or pattern.search(f"{k} {i}")) and (not tenant_id or self.tenant(i)[1] == tenant_id))
+        return [self.resource(k, i) for k, i in islice(matches, (page - 1) * self.page_size, page * self.page_size)]
+
+    def resource_body(self, kind, index):
+        body = self.resource(kind, index)
+        body['payload'] = {"description": 'x' * (self.resource_kb * 1024)}
+        if kind == 'correlator':
+            body['payload']['rules'] = [{"id": make_id(40, index * self.rules + i), "name": f"Rule {i}",
+                                         "kind": "correlationRule"} for i in range(self.rules)]
+        return body
+
+
+class MockHandler(BaseHTTPRequestHandler):
+
+    # keep-alive like the real core, and no Nagle delay on small pages
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode('utf8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def prepare(self):
+
+        # Counts the request and plays latency and errors, returns the
+        # path under /api/v3 or None when the request was answered here
+        server = self.server
+        url = urlparse(self.path)
+        with server.lock:
+            server.stats[url.path] = server.stats.get(url.path, 0) + 1
+
+        if url.path == '/_stats':
+            return url.path, {}
+
+        if server.latency:
+            time.sleep(max(0.0, random.gauss(server.latency, server.jitter)) / 1000)
+
+        if server.error_rate and random.random() < server.error_rate:
+            if server.error_code == 429:
+                self.send_response(429)
+                self.send_header('Retry-After', '1')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+            else:
+                self.send_json({"message": "mock error"}, server.error_code)
+            return None, None
+
+        return url.path[len('/api/v3'):], parse_qs(url.query)
+
+    def do_GET(self):
+
+        path, query = self.prepare()
+        if path is None:
+            return
+
+        data = self.server.data
+        page = int(query.get('page', ['1'])[0])
+        statuses = query.get('status')
+        time_field = query.get('timestampField', [None])[0]
+        time_range = (query.get('from', [None])[0], query.get('to', [None])[0]) if time_field else None
+
+        if path == '/_stats':
+            with self.server.lock:
+                self.send_json(dict(self.server.stats))
+        elif path == '/users/whoami':
+            self.send_json({"id": make_id(0, 0), "name": "mock"})
+        elif path == '/alerts':
+            indexes = data.matching(data.alerts, ALERT_STATUSES, statuses, time_range, page)
+            self.send_json([data.alert(index) for index in indexes])
+        elif path == '/incidents':
+            indexes = data.matching(data.incidents, INCIDENT_STATUSES, statuses, time_range, page)
+            self.send_json({"incidents": [data.incident(index) for index in indexes]})
+        elif path == '/tenants':
+            tenants = [{"id": make_id(1, i), "name": f"Tenant {i}"} for i in range(data.tenants)]
+            self.send_json(tenants[(page - 1) * data.page_size:page * data.page_size])
+        elif path == '/services':
+            correlators = [{"name": f"Correlator {i}", "tenantName": data.tenant(i)[0],
+                            "resourceID": data.resource('correlator', i)['id']} for i in range(data.correlators)]
+            self.send_json(correlators[(page - 1) * data.page_size:page * data.page_size])
+        elif path == '/resources':
+            self.send_json(data.resource_list(query.get('kind', [None])[0], query.get('name', [None])[0],
+                                              query.get('tenantID', [None])[0], page))
+        elif path.startswith('/resources/') and path.count('/') == 3:
+            _, _, kind, id = path.split('/')
+            index = uuid.UUID(id).int & (2**64 - 1) if kind in RESOURCE_KINDS else -1
+            if 0 <= index < data.resources:
+                self.send_json(data.resource_body(kind, index))
+            else:
+                self.send_json({"message": "not found"}, 404)
+        elif path == '/system/backup':
+            self.send_backup()
+        else:
+            self.send_json({"message": "not found"}, 404)
+
+    def send_backup(self):
+        chunk = bytes(range(256)) * 4096
+        size = self.server.data.backup_mb * 2**20
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/gzip')
+        self.send_header('Content-Length', str(size))
+        self.end_headers()
+        for sent in range(0, size, len(chunk)):
+            self.wfile.write(chunk[:size - sent])
+
+    def do_POST(self):
+
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            body = self.rfile.read(length)
+        else:
+            body = self.read_chunked()
+
+        path, query = self.prepare()
+        if path is None:
+            return
+
+        if path == '/assets/import':
+            assets = json.loads(body)['assets']
+            rejected = [asset['name'] for asset in assets if asset['name'].startswith('bad')]
+            if rejected:
+                self.send_json({"message": f"invalid assets: {', '.join(rejected)}"}, 400)
+            else:
+                self.send_json({"insertedIDs": {str(i): make_id(50, i) for i in range(len(assets))}})
+        elif path == '/system/restore':
+            self.send_json({})
+        else:
+            self.send_json({"message": "not found"}, 404)
+
+    def read_chunked(self):
+        # bodies of unknown length (streamed uploads) come chunked
+        body = bytearray()
+        while True:
+            size = int(self.rfile.readline().split(b';')[0], 16)
+            if not size:
+                self.rfile.readline()
+                return bytes(body)
+            body.extend(self.rfile.read(size))
+            self.rfile.readline()
+
+
+def start(port=0, host='127.0.0.1', latency=0, jitter=0, error_rate=0, error_code=503, **volumes):
+
+    # Starts the server in a daemon thread, port 0 picks a free one
+    # (server.server_port). volumes are MockData arguments.
+    server = ThreadingHTTPServer((host, port), MockHandler)
+    server.daemon_threads = True
+    server.data = MockData(**volumes)
+    server.latency = latency
+    server.jitter = jitter
+    server.error_rate = error_rate
+    server.error_code = error_code
+    server.stats = {}
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True, name='mock-kuma').start()
+    return server
+
+
+def build_parser():
+
+    parser = argparse.ArgumentParser(description="Local stand-in for the KUMA REST API (plain http)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7223)
+    parser.add_argument('--alerts', type=int, default=10000)
+    parser.add_argument('--incidents', type=int, default=10000)
+    parser.add_argument('--tenants', type=int, default=5)
+    parser.add_argument('--resources', type=int, default=50, help="resources of every kind")
+    parser.add_argument('--correlators', type=int, default=10)
+    parser.add_argument('--rules', type=int, default=50, help="rules in every correlator")
+    parser.add_argument('--resource-kb', type=int, default=4, help="padding of every resource body")
+    parser.add_argument('--backup-mb', type=int, default=16)
+    parser.add_argument('--latency', type=float, default=0, help="mean response delay, ms")
+    parser.add_argument('--jitter', type=float, default=0, help="standard deviation of the delay, ms")
+    parser.add_argument('--error-rate', type=float, default=0, help="share of requests answered with --error-code")
+    parser.add_argument('--error-code', type=int, default=503)
+    return parser
+
+
+def options_to_kwargs(options):
+    return {
+        'host': options.host, 'port': options.port, 'latency': options.latency, 'jitter': options.jitter,
+        'error_rate': options.error_rate, 'error_code': options.error_code,
+        'alerts': options.alerts, 'incidents': options.incidents, 'tenants': options.tenants,
+        'resources': options.resources, 'correlators': options.correlators, 'rules': options.rules,
+        'resource_kb': options.resource_kb, 'backup_mb': options.backup_mb
+    }
+
+
+if __name__ == "__main__":
+
+    options = build_parser().parse_args()
+    server = start(**options_to_kwargs(options))
+    print(f"Mock KUMA API on http://{options.host}:{server.server_port}/api/v3", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
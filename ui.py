@@ -0,0 +1,747 @@
+import gradio as gr
+import csv
+import json
+import os
+import re
+from time import strftime, time, localtime
+from itertools import islice
+
+from kuma_api import (JOB_WORKERS, RESOURCE_KINDS, ALERTS_COLUMNS, INCIDENTS_COLUMNS, JobManager, new_kuma, snapshot_store, artifact_store,
+                      available_formats, parse_columns,
+                      run_export, run_rules_export, run_backup, run_restore, run_resources_dump, run_snapshot,
+                      write_snapshots_diff, json_children, json_preview, json_query,
+                      read_assets_csv, validate_assets_csv, run_assets_import)
+
+
+SESSION_TTL = int(os.environ.get('KUMA_POMOGATOR_SESSION_TTL', 8 * 3600))
+
+CSS = """
+.toast-wrap.svelte-pu0yf1 {
+    background: #FFFFFF !important;
+    color: white !important;
+}
+"""
+
+
+def close_kuma(kuma):
+    # called by Gradio when a session's state expires or its tab is closed,
+    # jobs started from the session keep running with the client
+    if kuma is not None:
+        jobs.close_when_idle(kuma)
+
+
+def connected(kuma):
+    if kuma is None or not hasattr(kuma, 'base_url'):
+        raise gr.Error("Not connected to KUMA or the session has expired, please connect again")
+    return kuma
+
+
+def init_tabs(kuma, address, port, token):
+    # every connect gets a new client with its own connection pool, jobs
+    # started before keep working against the core they were started for
+    close_kuma(kuma)
+    kuma = new_kuma()
+    result = kuma.connect(address, port, token)
+    if result['status'] == kuma.OK:
+        gr.Info("Connection successful", duration=3)
+        return kuma, gr.Tab(visible=True), gr.Tab(visible=True), gr.Tab(visible=True), gr.Tab(visible=True), "Status: **Connected**"
+    else:
+        kuma.close()
+        return None, gr.Tab(visible=False), gr.Tab(visible=False), gr.Tab(visible=False), gr.Tab(visible=False), "Status: **Not connected**"
+
+
+def wait_for_job(job, progress):
+
+    # Mirrors the job's progress into the Gradio event while the browser
+    # waits for it. If the browser goes away the job keeps running and
+    # its result can be picked up on the Jobs tab.
+    while not job.done_event.wait(0.5):
+        if job.progress:
+            done, total, desc, unit = job.progress
+            progress((done, total), desc=f"{desc} (job {job.id})", unit=unit)
+
+    if job.status != 'done':
+        raise gr.Error(f"Job {job.id}: {job.details}")
+
+    if job.details:
+        (gr.Warning if job.warning else gr.Info)(job.details)
+
+    return job.path
+
+
+def export_columns(spec, default):
+    try:
+        return parse_columns(spec, default)
+    except ValueError as e:
+        raise gr.Error(f"Columns: {e}")
+
+
+def get_alerts_csv(kuma, status, time_field, start, end, sharded, incremental, fmt, columns, progress=gr.Progress()):
+    kuma = connected(kuma)
+    columns = export_columns(columns, ALERTS_COLUMNS)
+    job = jobs.submit("Alerts export", run_export, kuma, 'alerts', status, time_field, start, end, sharded, incremental,
+                      fmt, columns, owner=kuma.identity)
+    return wait_for_job(job, progress)
+
+
+def get_incidents_csv(kuma, status, time_field, start, end, sharded, incremental, fmt, columns, progress=gr.Progress()):
+    kuma = connected(kuma)
+    columns = export_columns(columns, INCIDENTS_COLUMNS)
+    job = jobs.submit("Incidents export", run_export, kuma, 'incidents', status, time_field, start, end, sharded, incremental,
+                      fmt, columns, owner=kuma.identity)
+    return wait_for_job(job, progress)
+
+
+def get_rules_csv(kuma, choice, correlator_id, tenant_id, fmt, progress=gr.Progress()):
+    kuma = connected(kuma)
+    job = jobs.submit("Rules export", run_rules_export, kuma, choice, correlator_id, tenant_id, fmt, owner=kuma.identity)
+    return wait_for_job(job, progress)
+
+
+def get_backup(kuma, progress=gr.Progress()):
+    kuma = connected(kuma)
+    gr.Info("Backup in progress, please wait.")
+    job = jobs.submit("Backup", run_backup, kuma, owner=kuma.identity)
+    return wait_for_job(job, progress)
+
+
+def restore_backup(kuma, file, progress=gr.Progress()):
+    kuma = connected(kuma)
+    job = jobs.submit("Restore", run_restore, kuma, file, owner=kuma.identity)
+    wait_for_job(job, progress)
+
+
+def search_resources(kuma, kind, name, tenant_id):
+    
+    kuma = connected(kuma)
+    # The local index answers once the kind is synced, until then and
+    # once the sync is older than the cache TTL the search goes to the API
+    if kuma.index.is_synced(kind, kuma.cache.ttl if kuma.cache.ttl > 0 else None):
+        try:
+            resources = kuma.index.search(kind, name, tenant_id)
+        except re.error as e:
+            raise gr.Error(f"Invalid regular expression: {e}")
+        return gr.Dropdown(interactive=True, choices=resources, value=None)
+
+    result, resources = kuma.get_resources_list(kind, name, tenant_id)
+
+    if result['status'] == kuma.OK:
+        return gr.Dropdown(interactive=True, choices=resources, value=None)
+    else:
+        raise gr.Error(result['details'])
+        return None
+
+
+def refresh_resources(kuma, kind, name, tenant_id, progress=gr.Progress()):
+
+    # A full re-list of the kind (of every kind without one) into the
+    # index, for resources created since its last sync
+    kuma = connected(kuma)
+    kuma.cache.invalidate('resources')
+    if kuma.index.refresh > 0:
+        for kind_to_sync in [kind] if kind else RESOURCE_KINDS:
+            progress(0, desc=f"Listing {kind_to_sync}")
+            result = kuma.index.sync_kind(kind_to_sync)
+            if result['status'] != kuma.OK:
+                raise gr.Error(result['details'])
+    return search_resources(kuma, kind, name, tenant_id)
+
+
+def get_resources_dump(kuma, fmt, progress=gr.Progress()):
+    kuma = connected(kuma)
+    job = jobs.submit("Resources dump", run_resources_dump, kuma, 'tar' if fmt == 'tar.gz' else 'ndjson', owner=kuma.identity)
+    return wait_for_job(job, progress)
+
+
+def create_snapshot(kuma, progress=gr.Progress()):
+
+    kuma = connected(kuma)
+    job = jobs.submit("Snapshot", run_snapshot, kuma, snapshot_store, owner=kuma.identity)
+    wait_for_job(job, progress)
+
+    return prepare_snapshots_dd(kuma)
+
+
+def prepare_snapshots_dd(kuma):
+    # a session sees only the snapshots taken with its own core and token
+    snapshots = snapshot_store.list(connected(kuma).identity)
+    return gr.Dropdown(choices=snapshots), gr.Dropdown(choices=snapshots)
+
+
+def get_snapshots_diff(kuma, snapshot_a, snapshot_b, by):
+
+    kuma = connected(kuma)
+    if not snapshot_a or not snapshot_b:
+        raise gr.Error("Choose two snapshots")
+    if not {snapshot_a, snapshot_b} <= set(snapshot_store.list(kuma.identity)):
+        raise gr.Error("No such snapshot for this connection")
+
+    by = 'id' if by == 'By id' else 'name'
+    temp_path = artifact_store.new_path(strftime("snapshots_diff_%Y%m%d_%H%M%S.csv"))
+    counts = write_snapshots_diff(temp_path, snapshot_store.root / snapshot_a, snapshot_store.root / snapshot_b, by)
+
+    summary = f"**Added:** {counts['added']}, **removed:** {counts['removed']}, **changed:** {counts['changed']}"
+    return summary, gr.File(value=artifact_store.add(temp_path), visible=True)
+
+
+def get_resource_json(kuma, kind_and_id):
+    kuma = connected(kuma)
+    if not kind_and_id:
+        raise gr.Error("Choose resource first")
+    kind, id = kind_and_id.split(';')
+    result, resource = kuma.get_resource(kind, id)
+    if result['status'] != kuma.OK:
+        raise gr.Error(result['details'])
+    return resource
+
+
+def view_resource_json(kuma, kind_and_id, path, depth, page, page_size=100):
+
+    # Lazy view of a resource: only the node(s) at path, cut after depth
+    # levels and paged by page_size entries, is sent to the browser
+    resource = get_resource_json(kuma, kind_and_id)
+    page = max(1, int(page or 1))
+
+    try:
+        matches = json_query(resource, path)
+    except ValueError as e:
+        raise gr.Error(str(e))
+
+    first = (page - 1) * page_size
+
+    if len(matches) == 1:
+        node_path, node = matches[0]
+        children = json_children(node_path, node)
+        shown = children[first:first + page_size]
+
+        if isinstance(node, dict):
+            preview = {k: json_preview(node[k], depth - 1) for k in islice(node, first, first + page_size)}
+        elif isinstance(node, list):
+            preview = [json_preview(v, depth - 1) for _, v in shown]
+        else:
+            preview = node
+
+        expandable = [child_path for child_path, child in shown if isinstance(child, (dict, list))]
+        info = f"`{node_path}`: {len(children)} entries, page {page} of {max(1, -(-len(children) // page_size))}"
+    else:
+        shown = matches[first:first + page_size]
+        preview = {match_path: json_preview(value, depth - 1) for match_path, value in shown}
+        expandable = [match_path for match_path, value in shown if isinstance(value, (dict, list))]
+        info = f"{len(matches)} matches, page {page} of {max(1, -(-len(matches) // page_size))}"
+
+    return preview, gr.Dropdown(choices=expandable, value=None), info
+
+
+def open_resource_json(kuma, kind_and_id, depth):
+    preview, expandable, info = view_resource_json(kuma, kind_and_id, '$', depth, 1)
+    return preview, expandable, info, '$', 1
+
+
+def expand_resource_json(kuma, kind_and_id, path, depth):
+    if not path:
+        return gr.skip(), gr.skip(), gr.skip(), gr.skip(), gr.skip()
+    preview, expandable, info = view_resource_json(kuma, kind_and_id, path, depth, 1)
+    return preview, expandable, info, path, 1
+
+
+def download_resource_json(kuma, kind_and_id):
+    resource = get_resource_json(kuma, kind_and_id)
+    kind, id = kind_and_id.split(';')
+    temp_path = artifact_store.new_path(f"{kind}_{id}.json")
+    with open(temp_path, 'w', encoding='utf8') as f:
+        json.dump(resource, f, ensure_ascii=False, indent=2)
+    return artifact_store.add(temp_path)
+
+
+def import_assets_from_csv(kuma, assets_in_csv, tenant_id, batch_size, progress=gr.Progress()):
+    
+    kuma = connected(kuma)
+    if not tenant_id:
+        raise gr.Error("Choose tenant first")
+    progress(0, desc="Validating CSV")
+    try:
+        errors = validate_assets_csv(assets_in_csv)
+    except Exception as e:
+        raise gr.Error(str(e))
+
+    if errors:
+        errors_path = artifact_store.new_path(strftime("invalid_assets_%Y%m%d_%H%M%S.csv"))
+        with open(errors_path, 'w', newline='', encoding='utf8') as csvfile:
+            writer = csv.writer(csvfile, delimiter=',')
+            writer.writerow(['line', 'field', 'value', 'reason'])
+            writer.writerows(errors)
+
+        gr.Warning(f"Nothing was imported: {len(errors)} problems found in CSV, see the report")
+        first = "\n".join(f"| {line} | {field} | {value} | {reason} |" for line, field, value, reason in errors[:20])
+        return ("| Line | Field | Value | Reason |\n|---|---|---|---|\n" + first,
+                gr.File(value=artifact_store.add(errors_path), visible=True, label="Invalid rows"))
+
+    try:
+        assets, lines = read_assets_csv(assets_in_csv)
+    except Exception as e:
+        raise gr.Error(str(e))
+   
+    job = jobs.submit("Assets import", run_assets_import, kuma, assets, lines, tenant_id, batch_size, owner=kuma.identity)
+    rejected_path = wait_for_job(job, progress)
+
+    return job.output, gr.File(value=rejected_path, visible=rejected_path is not None, label="Rejected assets")
+
+
+def list_jobs(kuma):
+    # only jobs started with the same core and token
+    rows = []
+    if kuma is None or not hasattr(kuma, 'identity'):
+        return rows
+    for job in jobs.list(kuma.identity):
+        duration = round((job.finished or time()) - job.started) if job.started else None
+        rows.append([job.id, job.name, job.status, job.describe_progress(), strftime('%H:%M:%S', localtime(job.created)),
+                     duration, job.details])
+    return rows
+
+
+def session_job(kuma, job_id):
+    # a job is only shown to the sessions of its own core and token, an id
+    # of someone else's job is not enough to cancel it or get its result
+    kuma = connected(kuma)
+    job = jobs.get(job_id)
+    if job is None or job.owner != kuma.identity:
+        raise gr.Error("No such job")
+    return job
+
+
+def select_job(kuma, evt: gr.SelectData):
+    job = session_job(kuma, evt.row_value[0])
+    return job.id, job.summary()
+
+
+def show_job_timing(kuma, job_id):
+    return session_job(kuma, job_id).summary()
+
+
+def cancel_job(kuma, job_id):
+    job = session_job(kuma, job_id)
+    job.cancel()
+    gr.Info(f"Job {job.id} is being cancelled")
+    return list_jobs(kuma)
+
+
+def get_job_result(kuma, job_id):
+    job = session_job(kuma, job_id)
+    if job.status != 'done':
+        raise gr.Error(f"Job {job.id} is {job.status}")
+    if not job.path:
+        raise gr.Error(f"Job {job.id} has no result file")
+    if not os.path.exists(job.path):
+        raise gr.Error(f"The result of job {job.id} was removed to free disk space, run it again")
+    return job.path
+
+
+def prepare_tenants_dd(kuma):
+    kuma = connected(kuma)
+    result, tenants = kuma.get_tenants()
+    if result['status'] == kuma.OK:
+        return gr.Dropdown(visible=True, choices=tenants, value=None, label="Choose tenant")
+    else:
+        raise gr.Error(result['details'])
+        return None
+
+
+def prepare_resource_tenants_dd(kuma):
+    kuma = connected(kuma)
+    result, tenants = kuma.get_tenants()
+    if result['status'] != kuma.OK:
+        raise gr.Error(result['details'])
+    return gr.Dropdown(choices=tenants, value=None)
+
+
+def prepare_tenants_and_correlators_dd(kuma, choice):
+    
+    kuma = connected(kuma)
+    if choice == "By tenant":
+        result, tenants = kuma.get_tenants()
+        if result['status'] != kuma.OK:
+            raise gr.Error(result['details'])
+        return gr.Dropdown(visible=False), gr.Dropdown(visible=True, value=None, choices=tenants)
+
+    elif choice == "All correlators":
+        return gr.Dropdown(visible=False), gr.Dropdown(visible=False)
+
+    else:
+        result, correlators = kuma.get_correlators()
+        if result['status'] != kuma.OK:
+            raise gr.Error(result['details'])
+        return gr.Dropdown(visible=True, value=None, choices=correlators), gr.Dropdown(visible=False)
+
+
+def refresh_tenants_dd(kuma):
+    connected(kuma).cache.invalidate('tenants')
+    return prepare_tenants_dd(kuma)
+
+
+def refresh_tenants_and_correlators_dd(kuma, choice):
+    connected(kuma).cache.invalidate('tenants')
+    kuma.cache.invalidate('correlators')
+    return prepare_tenants_and_correlators_dd(kuma, choice)
+
+
+jobs = JobManager(workers=JOB_WORKERS, store=artifact_store)
+
+with gr.Blocks(theme=gr.themes.Ocean(), css=CSS) as block_main:
+    
+    gr.Markdown("# KUMA's User Assistant")
+
+    # Kuma client of this browser session, see init_tabs
+    kuma_state = gr.State(None, time_to_live=SESSION_TTL, delete_callback=close_kuma)
+
+    # LOGIN
+    with gr.Row():
+
+        #TODO: change delete password and values!!!
+        address = gr.Textbox(show_label=False, placeholder="KUMA Core address", interactive=True)
+        port = gr.Textbox('7223', show_label=False, placeholder="KUMA API port", interactive=True)
+        token = gr.Textbox(show_label=False, placeholder="KUMA API Token", type='password', interactive=True)
+        
+        with gr.Column():
+
+            connect = gr.Button("Connect to KUMA")
+            connection_status = gr.Markdown("Status: **Not connected**")
+        
+    # HOME TAB
+    with gr.Tab("Home", visible=True, elem_id='home_tab') as home_tab:
+        home_md = gr.Markdown('''## Добро пожаловать в KUMA's User Assistant!
+                    
+                    Данный инструмент предназначен для помощи пользователям KUMA.
+
+                    Для того, чтобы начать, введите в поля выше адрес, порт, а также API-токен и нажмите кнопку Connect to KUMA.
+
+                    Если вы все сделали правильно, вы увидите дополнительные вкладки:
+
+                    **Export** - позволит экспортировать алерты, инциденты или правила корреляции в формате CSV
+
+                    **Assets** - позволит импортировать активы в формате CSV
+
+                    **Backup/Restore** - позволит выполнить резервное копирование и восстановление KUMA
+
+                    **Ananlyze** - позволит проанализировать в формате JSON любой ресурс KUMA
+                        ''')
+    
+    # EXPORT OT CSV ALERTS/INCIDENTS/RULES
+    with gr.Tab("Export", visible=False, elem_id='export_tab') as export_tab:
+        export_format = gr.Dropdown(available_formats(), value='csv', label="Format",
+                                    info="Compressed and columnar formats are smaller and load faster into analytics")
+        with gr.Row():
+
+            # ALERTS
+            with gr.Column():
+
+                gr.Markdown("### Alerts")
+                alert_status = gr.CheckboxGroup(["new", "assigned", "closed", "escalated"], 
+                                                label="Status", 
+                                                info="Check alert status to export", 
+                                                interactive=True, 
+                                                value=["new", "assigned", "closed", "escalated"])
+                alert_incremental = gr.Checkbox(label="Incremental", 
+                                                info="Only alerts changed (by lastSeen) since the previous incremental export", 
+                                                value=False)
+                
+                with gr.Accordion("Timestamp (optional)", open=False):
+                    with gr.Column():
+                        alert_time_field = gr.Dropdown(["firstSeen", "lastSeen"], value=None, label="Timestamp field")
+                        with gr.Row():
+                            alert_start = gr.DateTime(label="From", type='datetime')
+                            alert_end = gr.DateTime(label="To", type='datetime')
+                        alert_sharded = gr.Checkbox(label="Split into time windows", 
+                                                    info="Fetch parts of the period in parallel, for large exports", 
+                                                    value=False)
+
+                alert_columns = gr.Textbox(label="Columns", placeholder=",".join(column for column, _ in ALERTS_COLUMNS),
+                                           info="Comma separated, any alert field by its path, column=path to rename")
+
+                export_alerts = gr.Button("Export alerts")
+                export_alerts_hidden = gr.DownloadButton(visible=False, 
+                                                         elem_id='export_alerts_hidden')
+
+                export_alerts.click(fn=get_alerts_csv, 
+                                    inputs=[kuma_state, alert_status, alert_time_field, alert_start, alert_end, alert_sharded, alert_incremental,
+                                            export_format, alert_columns], 
+                                    outputs=export_alerts_hidden,
+                                    show_progress_on=export_alerts, concurrency_limit=None).then(fn=None, 
+                                                                       inputs=None, 
+                                                                       outputs=None, 
+                                                                       js="() => document.querySelector('#export_alerts_hidden').click()")
+
+            # INCIDENTS
+            with gr.Column():
+                
+                gr.Markdown("### Incidents")
+                incident_status = gr.CheckboxGroup(["open", "assigned", "closed"], 
+                                 label="Status",
+                                 info="Check incident status to export", 
+                                 interactive=True,
+                                 value=["open", "assigned", "closed"])
+                incident_incremental = gr.Checkbox(label="Incremental", 
+                                                   info="Only incidents changed (by updatedAt) since the previous incremental export", 
+                                                   value=False)
+                
+                with gr.Accordion("Timestamp (optional)", open=False):
+                    
+                    with gr.Column():
+                        incident_time_field = gr.Dropdown(["createdAt", "updatedAt"], value=None, label="Timestamp field")
+                        with gr.Row():
+                            incident_start = gr.DateTime(label="From", type='datetime')
+                            incident_end = gr.DateTime(label="To", type='datetime')
+                        incident_sharded = gr.Checkbox(label="Split into time windows", 
+                                                       info="Fetch parts of the period in parallel, for large exports", 
+                                                       value=False)
+
+                incident_columns = gr.Textbox(label="Columns", placeholder=",".join(column for column, _ in INCIDENTS_COLUMNS),
+                                              info="Comma separated, any incident field by its path, column=path to rename")
+
+                export_incidents = gr.Button("Export incidents")
+                export_incidents_hidden = gr.DownloadButton(visible=False, 
+                                                         elem_id='export_incidents_hidden')
+
+                export_incidents.click(fn=get_incidents_csv, 
+                                    inputs=[kuma_state, incident_status, incident_time_field, incident_start, incident_end, incident_sharded, incident_incremental,
+                                            export_format, incident_columns], 
+                                    outputs=export_incidents_hidden,
+                                    show_progress_on=export_incidents, concurrency_limit=None).then(fn=None, 
+                                                                       inputs=None, 
+                                                                       outputs=None, 
+                                                                       js="() => document.querySelector('#export_incidents_hidden').click()")
+
+            # RULES
+            with gr.Column():
+                
+                gr.Markdown("### Correaltion Rules")
+                # get_correlators = gr.Button("Get correlators")
+
+                rules_option = gr.Radio(["By correlator", "By tenant", "All correlators"], value="By correlator", label="Option")
+                
+                rules_correlators = gr.Dropdown(choices=None, 
+                       visible=True, interactive=True, 
+                       info="Select correlator", 
+                       label="Correlator")
+                
+                rules_tenants = gr.Dropdown(choices=None, 
+                       visible=False, interactive=True, 
+                       info="Select tenant", 
+                       label="Tenant")
+
+                refresh_rules_lists = gr.Button("Refresh lists", size="sm")
+                export_rules = gr.Button("Download rules", visible=True)
+                export_rules_hidden = gr.DownloadButton(visible=False, elem_id='export_rules_hidden')
+
+                export_tab.select(fn=prepare_tenants_and_correlators_dd, inputs=[kuma_state, rules_option], outputs=[rules_correlators, rules_tenants])
+                rules_option.change(fn=prepare_tenants_and_correlators_dd, inputs=[kuma_state, rules_option], outputs=[rules_correlators, rules_tenants])
+                refresh_rules_lists.click(fn=refresh_tenants_and_correlators_dd, inputs=[kuma_state, rules_option], outputs=[rules_correlators, rules_tenants])
+                export_rules.click(fn=get_rules_csv, 
+                                   inputs=[kuma_state, rules_option, rules_correlators, rules_tenants, export_format], 
+                                   outputs=export_rules_hidden,
+                                   show_progress_on=export_rules, concurrency_limit=None).then(fn=None, 
+                                                                     inputs=None, 
+                                                                     outputs=None, 
+                                                                     js="() => document.querySelector('#export_rules_hidden').click()")
+    
+    # ASSETS
+    with gr.Tab("Assets", visible=False, elem_id="assets_tab") as assets_tab:
+
+        gr.Markdown('''Чтобы импортировать активы, выберите тенант для импорта и загрузите csv-файл с активами.
+                    
+                    В csv-файле обязательно должен быть заголовок: name,fqdn,ipAddresses,macAddresses,osName,osVersion
+                    
+                    Для каждого актива должно быть заполнено как минимум одно из двух полей **fqdn** или **ipAddress**
+                    
+                    Поля **fqdn**, **ipAddresses**, **macAddresses** являются массивами, используйте **;** для разделения значений внутри
+                    ''')
+        
+        # get_tenants = gr.Button("Get tenants")
+        with gr.Row():
+            assets_tenants = gr.Dropdown(visible=True, scale=4)
+            refresh_assets_tenants = gr.Button("Refresh", size="sm", scale=1)
+        upload_assets_csv = gr.File(label="Upload CSV", visible=True, interactive=True)
+        assets_batch_size = gr.Number(1000, label="Batch size", precision=0, minimum=1,
+                                      info="Assets per request, batches are sent in parallel. A rejected batch is split until only the invalid assets are left out")
+        import_assets = gr.Button("Import assets from CSV", visible=True, interactive=False)
+        import_assets_report = gr.Markdown()
+        import_assets_rejected = gr.File(label="Rejected assets", visible=False)
+
+        # get_tenants.click(fn=prepare_tenants_dd, inputs=None, outputs=[tenants])
+
+        assets_tab.select(fn=prepare_tenants_dd, inputs=kuma_state, outputs=[assets_tenants])
+        refresh_assets_tenants.click(fn=refresh_tenants_dd, inputs=kuma_state, outputs=[assets_tenants])
+
+        upload_assets_csv.change(
+            fn=lambda x: gr.Button(interactive=True),
+                    inputs=upload_assets_csv,
+                    outputs=import_assets
+        )
+
+        upload_assets_csv.clear(
+            fn=lambda x: gr.Button(interactive=False),
+                    inputs=upload_assets_csv,
+                    outputs=import_assets
+        )
+
+        import_assets.click(fn=import_assets_from_csv, inputs=[kuma_state, upload_assets_csv, assets_tenants, assets_batch_size], 
+                            outputs=[import_assets_report, import_assets_rejected], concurrency_limit=None)
+
+    # BACKUP/RESTORE
+    with gr.Tab("Backup/Restore", visible=False) as backup_tab:
+        with gr.Row():
+            # BACKUP
+            with gr.Column():
+
+                export_backup = gr.Button("Create and download Backup", visible=True)
+                export_backup_hidden = gr.DownloadButton(visible=False, elem_id='export_backup_hidden')
+                export_backup.click(fn=get_backup, 
+                                        inputs=kuma_state, 
+                                        outputs=export_backup_hidden, api_name="process",
+                                        show_progress_on=export_backup, concurrency_limit=None).then(fn=None, 
+                                                                            inputs=None, 
+                                                                            outputs=None, 
+                                                                            js="() => document.querySelector('#export_backup_hidden').click()")
+            # RESTORE
+            with gr.Column():
+                
+                upload_backup = gr.File(label="Upload backup file", type='filepath')
+                import_backup = gr.Button("Restore backup", visible=False)
+
+                upload_backup.change(
+                    fn=lambda x: gr.Button(visible=True),
+                    inputs=upload_backup,
+                    outputs=import_backup
+                )
+
+                upload_backup.clear(
+                    fn=lambda x: gr.Button(visible=False),
+                    inputs=upload_backup,
+                    outputs=import_backup
+                )
+
+                import_backup.click(fn=restore_backup, inputs=[kuma_state, upload_backup], outputs=None, show_progress_on=import_backup,
+                                    concurrency_limit=None)
+
+            # RESOURCES DUMP
+            with gr.Column():
+
+                dump_format = gr.Radio(["ndjson.gz", "tar.gz"], value="ndjson.gz", label="Resources dump format",
+                                       info="Full JSON of every resource of every kind")
+                export_resources = gr.Button("Dump all resources", visible=True)
+                export_resources_hidden = gr.DownloadButton(visible=False, elem_id='export_resources_hidden')
+                export_resources.click(fn=get_resources_dump, 
+                                       inputs=[kuma_state, dump_format], 
+                                       outputs=export_resources_hidden,
+                                       show_progress_on=export_resources, concurrency_limit=None).then(fn=None, 
+                                                                               inputs=None, 
+                                                                               outputs=None, 
+                                                                               js="() => document.querySelector('#export_resources_hidden').click()")
+
+        # RESOURCES SNAPSHOTS
+        gr.Markdown("### Resources snapshots")
+        with gr.Row():
+            with gr.Column():
+
+                take_resources_snapshot = gr.Button("Take snapshot")
+                snapshot_a = gr.Dropdown(choices=None, label="Snapshot A", interactive=True)
+                snapshot_b = gr.Dropdown(choices=None, label="Snapshot B", interactive=True)
+                snapshots_diff_by = gr.Radio(["By id", "By name"], value="By id", label="Match resources",
+                                             info="By id, or by kind, tenant and name if resources were re-created")
+                diff_resources_snapshots = gr.Button("Diff snapshots")
+
+            with gr.Column():
+
+                snapshots_diff_summary = gr.Markdown()
+                snapshots_diff_file = gr.File(label="Diff", visible=False)
+
+        backup_tab.select(fn=prepare_snapshots_dd, inputs=kuma_state, outputs=[snapshot_a, snapshot_b])
+        take_resources_snapshot.click(fn=create_snapshot, inputs=kuma_state, outputs=[snapshot_a, snapshot_b],
+                                      show_progress_on=take_resources_snapshot, concurrency_limit=None)
+        diff_resources_snapshots.click(fn=get_snapshots_diff, inputs=[kuma_state, snapshot_a, snapshot_b, snapshots_diff_by],
+                                       outputs=[snapshots_diff_summary, snapshots_diff_file])
+
+    # RESOURCE IN JSON ANALYZER
+    with gr.Tab("Analyzer", visible=False) as json_tab:
+        with gr.Row():
+            with gr.Column():
+                
+                resource_kind = gr.Dropdown(RESOURCE_KINDS, value=None, label="Select resource kind")
+                resource_name = gr.Textbox(placeholder="RE:2 query to search resource", interactive=True)
+                resource_tenant = gr.Dropdown(choices=None, value=None, label="Tenant (optional)", interactive=True)
+                with gr.Row():
+                    search_resource = gr.Button("Search", scale=3)
+                    refresh_resources_index = gr.Button("Refresh", size="sm", scale=1)
+                resources_list = gr.Dropdown(label="Chose resource")
+                convert_resource_to_json = gr.Button("View resource in JSON")
+                download_resource = gr.Button("Download full JSON")
+                download_resource_hidden = gr.DownloadButton(visible=False, elem_id='download_resource_hidden')
+            
+            with gr.Column(scale=3):
+                
+                with gr.Row():
+                    resource_path = gr.Textbox("$", label="JSONPath", placeholder="$.payload.rules[*].name or $..name", 
+                                               interactive=True, scale=3)
+                    resource_depth = gr.Slider(1, 6, value=2, step=1, label="Depth", scale=1)
+                    resource_page = gr.Number(1, label="Page", precision=0, minimum=1, scale=1)
+                with gr.Row():
+                    query_resource = gr.Button("Show")
+                    resource_expand = gr.Dropdown(choices=[], label="Expand node", interactive=True)
+                resource_info = gr.Markdown()
+                resource_json = gr.JSON(show_indices=False)
+            
+            json_tab.select(fn=prepare_resource_tenants_dd, inputs=kuma_state, outputs=[resource_tenant])
+            search_resource.click(fn=search_resources, inputs=[kuma_state, resource_kind, resource_name, resource_tenant], outputs=[resources_list])
+            refresh_resources_index.click(fn=refresh_resources, inputs=[kuma_state, resource_kind, resource_name, resource_tenant],
+                                          outputs=[resources_list])
+            convert_resource_to_json.click(fn=open_resource_json, inputs=[kuma_state, resources_list, resource_depth], 
+                                           outputs=[resource_json, resource_expand, resource_info, resource_path, resource_page])
+            query_resource.click(fn=view_resource_json, inputs=[kuma_state, resources_list, resource_path, resource_depth, resource_page], 
+                                 outputs=[resource_json, resource_expand, resource_info])
+            resource_expand.input(fn=expand_resource_json, inputs=[kuma_state, resources_list, resource_expand, resource_depth], 
+                                  outputs=[resource_json, resource_expand, resource_info, resource_path, resource_page])
+            download_resource.click(fn=download_resource_json, 
+                                    inputs=[kuma_state, resources_list], 
+                                    outputs=download_resource_hidden).then(fn=None, 
+                                                                           inputs=None, 
+                                                                           outputs=None, 
+                                                                           js="() => document.querySelector('#download_resource_hidden').click()")
+
+    # JOBS
+    with gr.Tab("Jobs", visible=True) as jobs_tab:
+
+        gr.Markdown('''Долгие операции (экспорт, бэкап, восстановление, импорт активов, выгрузка и снимки ресурсов) выполняются как фоновые задачи.
+                    
+                    Задача продолжает выполняться, даже если закрыть вкладку браузера: найдите ее в списке по ID и скачайте результат или отмените ее.
+                    ''')
+        jobs_table = gr.Dataframe(headers=["ID", "Job", "Status", "Progress", "Created", "Duration, s", "Details"], 
+                                  interactive=False, wrap=True)
+        with gr.Row():
+            job_id = gr.Textbox(label="Job ID", placeholder="Click a job in the table or paste its ID", interactive=True, scale=3)
+            refresh_jobs = gr.Button("Refresh", scale=1)
+            cancel_selected_job = gr.Button("Cancel job", scale=1)
+            download_job = gr.Button("Download result", scale=1)
+            download_job_hidden = gr.DownloadButton(visible=False, elem_id='download_job_hidden')
+        with gr.Accordion("Timing", open=False):
+            job_timing = gr.JSON(label="Where the job spent its time: queue, run time and API calls by endpoint")
+        jobs_timer = gr.Timer(5)
+
+        jobs_tab.select(fn=list_jobs, inputs=kuma_state, outputs=jobs_table)
+        refresh_jobs.click(fn=list_jobs, inputs=kuma_state, outputs=jobs_table)
+        jobs_timer.tick(fn=list_jobs, inputs=kuma_state, outputs=jobs_table, show_progress='hidden')
+        jobs_table.select(fn=select_job, inputs=kuma_state, outputs=[job_id, job_timing])
+        job_id.submit(fn=show_job_timing, inputs=[kuma_state, job_id], outputs=job_timing)
+        cancel_selected_job.click(fn=cancel_job, inputs=[kuma_state, job_id], outputs=jobs_table)
+        download_job.click(fn=get_job_result, 
+                           inputs=[kuma_state, job_id], 
+                           outputs=download_job_hidden).then(fn=None, 
+                                                             inputs=None, 
+                                                             outputs=None, 
+                                                             js="() => document.querySelector('#download_job_hidden').click()")
+
+    connect.click(fn=init_tabs, inputs=[kuma_state, address, port, token], 
+                  outputs=[kuma_state, export_tab, assets_tab, backup_tab, json_tab, connection_status])
+
+    
+if __name__ == "__main__":
+    artifact_store.cleanup()
+    block_main.launch(allowed_paths=[str(artifact_store.root)])